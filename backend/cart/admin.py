@@ -18,6 +18,10 @@ class CartAdmin(admin.ModelAdmin):
     
     readonly_fields = ('created_at', 'updated_at')
     
+    def get_queryset(self, request):
+        # Totals for the whole changelist page come from one query
+        return super().get_queryset(request).select_related('user').with_totals()
+    
     def get_total_items(self, obj):
         return obj.get_total_items()
     get_total_items.short_description = 'Total Items'
@@ -1,8 +1,19 @@
 from django.db import models
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator
 from django.conf import settings
 from products.models import Product
 
+class CartQuerySet(models.QuerySet):
+    def with_totals(self):
+        """Annotate each cart with its number of items and their total quantity"""
+        return self.annotate(
+            items_count=Count('items'),
+            items_quantity=Coalesce(Sum('items__quantity'), 0),
+        )
+
+
 class Cart(models.Model):
     """Shopping cart model for users"""
     
@@ -11,6 +22,8 @@ class Cart(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
     
+    objects = CartQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Cart'
         verbose_name_plural = 'Carts'
@@ -19,15 +32,43 @@ class Cart(models.Model):
     def __str__(self):
         return f"Cart for {self.user.business_name or self.user.username}"
     
+    def get_totals(self):
+        """
+        Return ``(item_count, total_quantity)`` for the cart.
+        
+        Uses prefetched items or with_totals() annotations when present,
+        otherwise aggregates in a single query. The result is kept until
+        refresh_from_db().
+        """
+        if not hasattr(self, '_totals'):
+            prefetched = getattr(self, '_prefetched_objects_cache', {}).get('items')
+            if prefetched is not None:
+                self._totals = (len(prefetched), sum(item.quantity for item in prefetched))
+            elif hasattr(self, 'items_count'):
+                self._totals = (self.items_count, self.items_quantity)
+            else:
+                totals = self.items.aggregate(
+                    count=Count('id'),
+                    quantity=Coalesce(Sum('quantity'), 0)
+                )
+                self._totals = (totals['count'], totals['quantity'])
+        return self._totals
+    
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        # Totals may be stale once the items changed
+        for attr in ('_totals', 'items_count', 'items_quantity'):
+            self.__dict__.pop(attr, None)
+    
     @property
     def total_items(self):
         """Get total number of items in cart"""
-        return sum(item.quantity for item in self.items.all())
+        return self.get_totals()[1]
     
     @property
     def total_quantity(self):
         """Calculate total cart items count"""
-        return sum(item.quantity for item in self.items.all())
+        return self.get_totals()[1]
     
     def get_total_items(self):
         """Get total number of items in cart (legacy method)"""
@@ -40,6 +81,7 @@ class Cart(models.Model):
     def clear(self):
         """Remove all items from cart"""
         self.items.all().delete()
+        self.__dict__.pop('_totals', None)
         self.save()
 
 class CartItem(models.Model):
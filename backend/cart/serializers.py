@@ -1,6 +1,10 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import Cart, CartItem
-from products.serializers import ProductListSerializer
+from products.serializers import (
+    FastRepresentationMixin, ProductListSerializer, format_datetime,
+    product_list_representation
+)
 
 
 class CartItemSerializer(serializers.ModelSerializer):
@@ -34,6 +38,19 @@ class CartItemSerializer(serializers.ModelSerializer):
         return data
 
 
+class CartItemFastSerializer(FastRepresentationMixin, serializers.BaseSerializer):
+    """Read-only fast path for CartItemSerializer (see FAST_READ_SERIALIZERS)"""
+    
+    def to_representation(self, item):
+        return {
+            'id': item.id,
+            'product': product_list_representation(item.product, categories=self.categories),
+            'quantity': item.quantity,
+            'added_at': format_datetime(item.added_at),
+            'updated_at': format_datetime(item.updated_at),
+        }
+
+
 class CartSerializer(serializers.ModelSerializer):
     items = CartItemSerializer(many=True, read_only=True)
     total_items = serializers.ReadOnlyField()
@@ -46,6 +63,12 @@ class CartSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at', 'is_active'
         ]
         read_only_fields = ['id', 'user', 'created_at', 'updated_at']
+    
+    def get_fields(self):
+        fields = super().get_fields()
+        if settings.FAST_READ_SERIALIZERS:
+            fields['items'] = CartItemFastSerializer(many=True, read_only=True)
+        return fields
 
 
 class AddToCartSerializer(serializers.Serializer):
@@ -0,0 +1,532 @@
+"""
+Hot cart store: active carts kept in Redis hashes and written back to
+Cart/CartItem asynchronously.
+
+Enabled with CART_STORE = 'redis'; 'memory' runs the same code against an
+in-process stand-in (LocalRedis) for development and tests. Per user the
+store keeps
+
+    cart:<user_id>          cart_id, user_id, created_at, updated_at
+    cart:<user_id>:qty      product_id -> quantity
+    cart:<user_id>:items    product_id -> "<cart item id>|<added_at>"
+    cart:<user_id>:touched  product_id -> updated_at
+
+Reads, increments, quantity changes, removals and clears are a handful of
+hash commands. A new line is still inserted into CartItem right away, since
+the API addresses lines by their CartItem id. Every other change reaches the
+database when the cart is flushed: CART_STORE_FLUSH_DELAY seconds after the
+change (the flush_cart task), from the periodic flush_dirty_carts sweep, or
+at checkout.
+"""
+import logging
+import threading
+from datetime import datetime
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from products.models import Product
+from .models import Cart, CartItem
+
+logger = logging.getLogger(__name__)
+
+DIRTY_KEY = 'cart:dirty'
+
+
+class LocalRedis:
+    """
+    In-process stand-in for the few Redis commands the cart store uses.
+
+    Values are kept as strings, as a client with decode_responses=True
+    returns them. Not shared between processes.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.RLock()
+
+    def _hash(self, name):
+        return self.data.setdefault(name, {})
+
+    def exists(self, name):
+        with self.lock:
+            return int(bool(self.data.get(name)))
+
+    def delete(self, *names):
+        with self.lock:
+            return sum(self.data.pop(name, None) is not None for name in names)
+
+    def expire(self, name, seconds):
+        # Entries live for the lifetime of the process
+        return self.exists(name)
+
+    def hgetall(self, name):
+        with self.lock:
+            return dict(self.data.get(name, {}))
+
+    def hvals(self, name):
+        with self.lock:
+            return list(self.data.get(name, {}).values())
+
+    def hexists(self, name, key):
+        with self.lock:
+            return str(key) in self.data.get(name, {})
+
+    def hset(self, name, key=None, value=None, mapping=None):
+        with self.lock:
+            values = self._hash(name)
+            items = dict(mapping or {})
+            if key is not None:
+                items[key] = value
+            added = sum(str(field) not in values for field in items)
+            values.update({str(field): str(value) for field, value in items.items()})
+            return added
+
+    def hsetnx(self, name, key, value):
+        with self.lock:
+            values = self._hash(name)
+            if str(key) in values:
+                return 0
+            values[str(key)] = str(value)
+            return 1
+
+    def hincrby(self, name, key, amount=1):
+        with self.lock:
+            values = self._hash(name)
+            values[str(key)] = str(int(values.get(str(key), 0)) + amount)
+            return int(values[str(key)])
+
+    def hdel(self, name, *keys):
+        with self.lock:
+            values = self.data.get(name, {})
+            return sum(values.pop(str(key), None) is not None for key in keys)
+
+    def sadd(self, name, *members):
+        with self.lock:
+            values = self.data.setdefault(name, set())
+            added = {str(member) for member in members} - values
+            values.update(added)
+            return len(added)
+
+    def srem(self, name, *members):
+        with self.lock:
+            values = self.data.get(name, set())
+            removed = {str(member) for member in members} & values
+            values.difference_update(removed)
+            return len(removed)
+
+    def smembers(self, name):
+        with self.lock:
+            return set(self.data.get(name, set()))
+
+    def flushall(self):
+        with self.lock:
+            self.data.clear()
+
+    def pipeline(self, transaction=True):
+        return LocalPipeline(self)
+
+
+class LocalPipeline:
+    """Queues commands and runs them under the LocalRedis lock, like MULTI/EXEC"""
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+
+        def queue(*args, **kwargs):
+            self.commands.append((method, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        with self.client.lock:
+            results = [method(*args, **kwargs) for method, args, kwargs in self.commands]
+        self.commands = []
+        return results
+
+
+class CartState:
+    """Snapshot of one user's cart as held in the store"""
+
+    def __init__(self, meta, quantities, items, touched):
+        self.cart_id = int(meta['cart_id'])
+        self.user_id = int(meta['user_id'])
+        self.created_at = datetime.fromisoformat(meta['created_at'])
+        self.updated_at = datetime.fromisoformat(meta['updated_at'])
+        self.lines = []
+        for product_id, quantity in quantities.items():
+            if product_id not in items:
+                # A line whose CartItem is being created by a concurrent add
+                continue
+            item_id, added_at = items[product_id].split('|')
+            self.lines.append({
+                'id': int(item_id),
+                'product_id': int(product_id),
+                'quantity': int(quantity),
+                'added_at': datetime.fromisoformat(added_at),
+                'updated_at': datetime.fromisoformat(touched.get(product_id, added_at)),
+            })
+        # CartItem.Meta.ordering
+        self.lines.sort(key=lambda line: line['added_at'], reverse=True)
+
+    def find(self, item_id):
+        """The line for a CartItem id, or None"""
+        for line in self.lines:
+            if line['id'] == item_id:
+                return line
+        return None
+
+
+class CartStore:
+    """Active carts in a Redis-compatible client, persisted by flush()"""
+
+    def __init__(self, client, flush_delay=None, ttl=None):
+        self.client = client
+        self.flush_delay = flush_delay
+        self.ttl = ttl
+
+    def keys(self, user_id):
+        base = f'cart:{user_id}'
+        return base, f'{base}:qty', f'{base}:items', f'{base}:touched'
+
+    def snapshot(self, user_id):
+        """Read the user's cart in one round trip; None when it isn't loaded"""
+        pipeline = self.client.pipeline()
+        for key in self.keys(user_id):
+            pipeline.hgetall(key)
+        meta, quantities, items, touched = pipeline.execute()
+        if not meta:
+            return None
+        return CartState(meta, quantities, items, touched)
+
+    def load(self, user_id, create=True):
+        """
+        Return the user's cart state, loading it from the database if needed.
+
+        Returns None when the user has no active cart and ``create`` is off.
+        """
+        state = self.snapshot(user_id)
+        if state is not None:
+            return state
+
+        if create:
+            cart, created = Cart.objects.get_or_create(user_id=user_id, is_active=True)
+        else:
+            cart = Cart.objects.filter(user_id=user_id, is_active=True).first()
+            if cart is None:
+                return None
+
+        meta_key, qty_key, items_key, touched_key = self.keys(user_id)
+        pipeline = self.client.pipeline()
+        # HSETNX so a change made by a concurrent request is not overwritten
+        for item in cart.items.all():
+            pipeline.hsetnx(qty_key, item.product_id, item.quantity)
+            pipeline.hsetnx(items_key, item.product_id, f'{item.id}|{item.added_at.isoformat()}')
+            pipeline.hsetnx(touched_key, item.product_id, item.updated_at.isoformat())
+        # The meta hash goes last: its presence marks the cart as loaded
+        pipeline.hset(meta_key, mapping={
+            'cart_id': cart.id,
+            'user_id': cart.user_id,
+            'created_at': cart.created_at.isoformat(),
+            'updated_at': cart.updated_at.isoformat(),
+        })
+        self.expire(pipeline, user_id)
+        pipeline.execute()
+        return self.snapshot(user_id)
+
+    def expire(self, pipeline, user_id):
+        if self.ttl:
+            for key in self.keys(user_id):
+                pipeline.expire(key, self.ttl)
+
+    def changed(self, pipeline, user_id, now):
+        """Queue the bookkeeping shared by every mutation and run the pipeline"""
+        pipeline.hset(self.keys(user_id)[0], 'updated_at', now.isoformat())
+        self.expire(pipeline, user_id)
+        results = pipeline.execute()
+        self.schedule_flush(user_id)
+        return results
+
+    def add(self, user_id, product_id, quantity):
+        """Add ``quantity`` of a product, creating the line if needed"""
+        state = self.load(user_id)
+        meta_key, qty_key, items_key, touched_key = self.keys(user_id)
+        now = timezone.now()
+
+        if not self.client.hexists(items_key, product_id):
+            # The line needs a CartItem id; an existing row (a line removed
+            # since the last flush) is reused
+            item, created = CartItem.objects.get_or_create(
+                cart_id=state.cart_id,
+                product_id=product_id,
+                defaults={'quantity': quantity}
+            )
+            pipeline = self.client.pipeline()
+            pipeline.hsetnx(items_key, product_id, f'{item.id}|{item.added_at.isoformat()}')
+            pipeline.execute()
+
+        pipeline = self.client.pipeline()
+        pipeline.hincrby(qty_key, product_id, quantity)
+        pipeline.hset(touched_key, product_id, now.isoformat())
+        self.changed(pipeline, user_id, now)
+        return self.snapshot(user_id)
+
+    def set_quantity(self, user_id, item_id, quantity):
+        """Set a line's quantity; returns None if the user has no such line"""
+        state = self.load(user_id, create=False)
+        line = state and state.find(item_id)
+        if line is None:
+            return None
+
+        meta_key, qty_key, items_key, touched_key = self.keys(user_id)
+        now = timezone.now()
+        pipeline = self.client.pipeline()
+        pipeline.hset(qty_key, line['product_id'], quantity)
+        pipeline.hset(touched_key, line['product_id'], now.isoformat())
+        self.changed(pipeline, user_id, now)
+        return self.snapshot(user_id)
+
+    def remove(self, user_id, item_id):
+        """Remove a line; returns None if the user has no such line"""
+        state = self.load(user_id, create=False)
+        line = state and state.find(item_id)
+        if line is None:
+            return None
+
+        meta_key, qty_key, items_key, touched_key = self.keys(user_id)
+        pipeline = self.client.pipeline()
+        for key in (qty_key, items_key, touched_key):
+            pipeline.hdel(key, line['product_id'])
+        self.changed(pipeline, user_id, timezone.now())
+        return self.snapshot(user_id)
+
+    def clear(self, user_id):
+        """Remove every line; returns None if the user has no active cart"""
+        if self.load(user_id, create=False) is None:
+            return None
+
+        meta_key, qty_key, items_key, touched_key = self.keys(user_id)
+        pipeline = self.client.pipeline()
+        pipeline.delete(qty_key, items_key, touched_key)
+        self.changed(pipeline, user_id, timezone.now())
+        return self.snapshot(user_id)
+
+    def summary(self, user_id):
+        """``(item_count, total_quantity)``, or None without an active cart"""
+        state = self.load(user_id, create=False)
+        if state is None:
+            return None
+        # Lines of deleted products are left out, as in build_cart()
+        existing = self.existing_products(state.lines)
+        quantities = [line['quantity'] for line in state.lines if line['product_id'] in existing]
+        return len(quantities), sum(quantities)
+
+    def existing_products(self, lines):
+        """Ids of the products of ``lines`` that still exist"""
+        product_ids = [line['product_id'] for line in lines]
+        if not product_ids:
+            return set()
+        return set(Product.objects.filter(id__in=product_ids).values_list('id', flat=True))
+
+    def build_cart(self, state, products=None):
+        """
+        An unsaved Cart carrying the state's lines as prefetched items, for
+        CartSerializer. ``products`` maps ids to products loaded with their
+        category; missing ones are fetched in one query.
+        """
+        products = dict(products or {})
+        missing = [line['product_id'] for line in state.lines if line['product_id'] not in products]
+        if missing:
+            products.update(Product.objects.select_related('category').in_bulk(missing))
+
+        cart = Cart(
+            id=state.cart_id,
+            user_id=state.user_id,
+            created_at=state.created_at,
+            updated_at=state.updated_at,
+            is_active=True
+        )
+        items = [
+            CartItem(
+                id=line['id'],
+                cart=cart,
+                product=products[line['product_id']],
+                quantity=line['quantity'],
+                added_at=line['added_at'],
+                updated_at=line['updated_at']
+            )
+            for line in state.lines
+            if line['product_id'] in products
+        ]
+        cart._prefetched_objects_cache = {'items': items}
+        return cart
+
+    def schedule_flush(self, user_id):
+        """Mark the cart dirty and schedule one write-back for it"""
+        if not self.client.sadd(DIRTY_KEY, user_id) or self.flush_delay is None:
+            # Already scheduled, or left to flush_dirty_carts and checkout
+            return
+        self.enqueue_flush(user_id)
+
+    def enqueue_flush(self, user_id):
+        from .tasks import flush_cart
+        try:
+            flush_cart.apply_async((user_id,), countdown=self.flush_delay)
+        except Exception as e:
+            # The periodic sweep still picks the cart up
+            logger.warning(f"Could not schedule cart flush for user {user_id}: {e}")
+
+    def flush(self, user_id):
+        """
+        Write the user's cart from the store to Cart/CartItem.
+
+        Returns the number of CartItem rows created, updated or deleted.
+        """
+        # Cleared first: a change made during the flush marks the cart again
+        self.client.srem(DIRTY_KEY, user_id)
+        try:
+            return self.write_back(user_id)
+        except Exception:
+            # Keep the changes for the next sweep instead of letting them
+            # expire with the store keys
+            self.client.sadd(DIRTY_KEY, user_id)
+            raise
+
+    def write_back(self, user_id):
+        """The body of flush(), without the dirty marker bookkeeping"""
+        state = self.snapshot(user_id)
+        if state is None:
+            return 0
+
+        with transaction.atomic():
+            # Serializes concurrent flushes of one cart; the snapshot is
+            # re-read under the lock so the last flush writes the newest state
+            cart = Cart.objects.select_for_update().filter(id=state.cart_id, is_active=True).first()
+            if cart is None:
+                # Checked out or deactivated elsewhere
+                self.discard(user_id)
+                return 0
+            state = self.snapshot(user_id)
+            if state is None:
+                return 0
+
+            lines = {line['product_id']: line for line in state.lines}
+            # A deleted product took its CartItem row with it; drop its line
+            # from the store too rather than inserting a row for it
+            existing = self.existing_products(state.lines)
+            orphaned = [product_id for product_id in lines if product_id not in existing]
+            if orphaned:
+                pipeline = self.client.pipeline()
+                for key in self.keys(user_id)[1:]:
+                    pipeline.hdel(key, *orphaned)
+                pipeline.execute()
+                for product_id in orphaned:
+                    del lines[product_id]
+            stored = {item.product_id: item for item in CartItem.objects.filter(cart=cart)}
+
+            deleted = [item.id for product_id, item in stored.items() if product_id not in lines]
+            updated = []
+            for product_id, item in stored.items():
+                line = lines.get(product_id)
+                if line and (item.quantity != line['quantity'] or item.updated_at != line['updated_at']):
+                    item.quantity = line['quantity']
+                    item.updated_at = line['updated_at']
+                    updated.append(item)
+            created = [
+                CartItem(
+                    cart=cart,
+                    product_id=product_id,
+                    quantity=line['quantity'],
+                    added_at=line['added_at'],
+                    updated_at=line['updated_at']
+                )
+                for product_id, line in lines.items()
+                if product_id not in stored
+            ]
+
+            if deleted:
+                CartItem.objects.filter(id__in=deleted).delete()
+            if updated:
+                CartItem.objects.bulk_update(updated, ['quantity', 'updated_at'])
+            if created:
+                CartItem.objects.bulk_create(created)
+                # Not every backend returns primary keys from a bulk insert
+                ids = dict(CartItem.objects.filter(
+                    cart=cart, product_id__in=[item.product_id for item in created]
+                ).values_list('product_id', 'id'))
+                items_key = self.keys(user_id)[2]
+                pipeline = self.client.pipeline()
+                for item in created:
+                    pipeline.hset(items_key, item.product_id, f'{ids[item.product_id]}|{item.added_at.isoformat()}')
+                pipeline.execute()
+            Cart.objects.filter(id=cart.id).update(updated_at=state.updated_at)
+
+        return len(deleted) + len(updated) + len(created)
+
+    def flush_dirty(self):
+        """
+        Flush every cart changed since its last flush; returns the number
+        flushed. A cart that fails is logged and stays dirty.
+        """
+        flushed = 0
+        for user_id in self.client.smembers(DIRTY_KEY):
+            try:
+                self.flush(int(user_id))
+            except Exception:
+                logger.exception(f"Cart flush failed for user {user_id}")
+            else:
+                flushed += 1
+        return flushed
+
+    def discard(self, user_id):
+        """Drop the user's cart from the store, e.g. after checkout"""
+        pipeline = self.client.pipeline()
+        pipeline.delete(*self.keys(user_id))
+        pipeline.srem(DIRTY_KEY, user_id)
+        pipeline.execute()
+
+
+class LocalCartStore(CartStore):
+    """CartStore over LocalRedis; write-backs run on a timer thread"""
+
+    def enqueue_flush(self, user_id):
+        timer = threading.Timer(self.flush_delay, self.flush_in_thread, (user_id,))
+        timer.daemon = True
+        timer.start()
+
+    def flush_in_thread(self, user_id):
+        try:
+            self.flush(user_id)
+        except Exception:
+            logger.exception(f"Cart flush failed for user {user_id}")
+        finally:
+            close_old_connections()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_cart_store():
+    """The configured hot cart store, or None when carts live in the database only"""
+    engine = settings.CART_STORE
+    if engine == 'database':
+        return None
+
+    key = (engine, settings.CART_STORE_REDIS_URL, settings.CART_STORE_FLUSH_DELAY, settings.CART_STORE_TTL)
+    with _stores_lock:
+        if key not in _stores:
+            if engine == 'memory':
+                _stores[key] = LocalCartStore(LocalRedis(), settings.CART_STORE_FLUSH_DELAY)
+            elif engine == 'redis':
+                import redis
+                client = redis.Redis.from_url(settings.CART_STORE_REDIS_URL, decode_responses=True)
+                _stores[key] = CartStore(client, settings.CART_STORE_FLUSH_DELAY, settings.CART_STORE_TTL)
+            else:
+                raise ValueError(f"Unknown CART_STORE engine: {engine!r}")
+        return _stores[key]
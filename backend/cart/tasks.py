@@ -0,0 +1,35 @@
+"""
+Celery tasks for cart app.
+
+Write-behind persistence for the hot cart store (see cart.store).
+"""
+from celery import shared_task
+import logging
+
+from .store import get_cart_store
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def flush_cart(user_id):
+    """Write one user's cart from the hot store to the database"""
+    store = get_cart_store()
+    if store is not None:
+        store.flush(user_id)
+
+
+@shared_task(ignore_result=True)
+def flush_dirty_carts():
+    """
+    Periodic sweep for carts whose scheduled flush was lost.
+    
+    Returns the number of carts flushed.
+    """
+    store = get_cart_store()
+    if store is None:
+        return 0
+    flushed = store.flush_dirty()
+    if flushed:
+        logger.info(f"Flushed {flushed} dirty carts")
+    return flushed
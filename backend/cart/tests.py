@@ -1,3 +1,289 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from orders.models import Order
+from products.models import Category, Product
+from .models import Cart, CartItem
+from .store import DIRTY_KEY, LocalCartStore, get_cart_store
+
+
+class CartTotalsTests(TestCase):
+    """Cart totals are aggregated in the database, not summed over loaded items"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='buyer', password='secret')
+        category = Category.objects.create(name='Grain Market', slug='grain-market')
+        cls.products = [
+            Product.objects.create(item_code=str(10000 + index), name=f'PRODUCT {index}', category=category)
+            for index in range(3)
+        ]
+        cls.cart = Cart.objects.create(user=cls.user)
+        for quantity, product in enumerate(cls.products, start=2):
+            CartItem.objects.create(cart=cls.cart, product=product, quantity=quantity)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_totals_in_one_query(self):
+        cart = Cart.objects.get(pk=self.cart.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(cart.total_items, 9)
+            self.assertEqual(cart.total_quantity, 9)
+            self.assertEqual(cart.get_totals(), (3, 9))
+
+    def test_annotated_totals(self):
+        cart = Cart.objects.with_totals().get(pk=self.cart.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(cart.get_totals(), (3, 9))
+
+    def test_totals_after_refresh(self):
+        cart = Cart.objects.with_totals().get(pk=self.cart.pk)
+        cart.items.filter(product=self.products[0]).delete()
+        cart.refresh_from_db()
+        self.assertEqual(cart.get_totals(), (2, 7))
+
+    def test_summary(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/cart/summary/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'total_items': 9, 'total_quantity': 9.0, 'item_count': 3})
+
+    def test_summary_without_cart(self):
+        self.cart.delete()
+        response = self.client.get('/api/cart/summary/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'total_items': 0, 'total_quantity': 0.0, 'item_count': 0})
+
+
+class CartSerializationQueryTests(TestCase):
+    """Cart responses cost a constant number of queries, whatever the number of lines"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='restaurant', password='secret')
+        categories = [
+            Category.objects.create(name=f'Category {index}', slug=f'category-{index}')
+            for index in range(5)
+        ]
+        cls.products = Product.objects.bulk_create([
+            Product(item_code=str(20000 + index), name=f'PRODUCT {index}', category=categories[index % 5])
+            for index in range(41)
+        ])
+        cls.cart = Cart.objects.create(user=cls.user)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def fill_cart(self, lines):
+        CartItem.objects.bulk_create([
+            CartItem(cart=self.cart, product=product, quantity=2) for product in self.products[:lines]
+        ])
+
+    def assertCartQueries(self, count, method, url, data=None):
+        """Run the request against a 1-line and a 40-line cart"""
+        for lines in (1, 40):
+            with self.subTest(lines=lines):
+                CartItem.objects.filter(cart=self.cart).delete()
+                self.fill_cart(lines)
+                item = CartItem.objects.filter(cart=self.cart).first()
+                with self.assertNumQueries(count):
+                    response = getattr(self.client, method)(url.format(item_id=item.id), data, format='json')
+                self.assertEqual(response.status_code, 200, response.content)
+
+    def test_get_cart(self):
+        self.assertCartQueries(2, 'get', '/api/cart/')
+
+    def test_add_to_cart(self):
+        self.assertCartQueries(10, 'post', '/api/cart/add/', {'product_id': self.products[40].id, 'quantity': 1})
+
+    def test_update_cart_item(self):
+        self.assertCartQueries(4, 'patch', '/api/cart/items/{item_id}/update/', {'quantity': 5})
+
+    def test_remove_from_cart(self):
+        self.assertCartQueries(4, 'delete', '/api/cart/items/{item_id}/remove/')
+
+    def test_clear_cart(self):
+        self.assertCartQueries(4, 'delete', '/api/cart/clear/')
+
+
+@override_settings(FAST_READ_SERIALIZERS=True)
+class FastCartSerializationQueryTests(CartSerializationQueryTests):
+    """Same query counts with the fast read serializers"""
+
+
+@override_settings(CART_STORE='memory', CART_STORE_FLUSH_DELAY=None)
+class HotCartStoreTests(TestCase):
+    """Carts served from the in-process stand-in for the Redis cart store"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username='rush', password='secret', email='rush@example.com'
+        )
+        category = Category.objects.create(name='Grain Market', slug='grain-market')
+        cls.products = Product.objects.bulk_create([
+            Product(item_code=str(30000 + index), name=f'PRODUCT {index}', category=category)
+            for index in range(3)
+        ])
+
+    def setUp(self):
+        self.store = get_cart_store()
+        self.store.client.flushall()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add(self, product, quantity):
+        response = self.client.post(
+            '/api/cart/add/', {'product_id': product.id, 'quantity': quantity}, format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def stored_quantities(self):
+        return dict(CartItem.objects.filter(cart__user=self.user).values_list('product_id', 'quantity'))
+
+    def test_writes_reach_the_database_on_flush(self):
+        self.add(self.products[0], 2)
+        cart = self.add(self.products[0], 3)
+        self.add(self.products[1], 1)
+
+        self.assertEqual(cart['total_quantity'], 5)
+        # New lines are inserted right away, increments wait for the flush
+        self.assertEqual(self.stored_quantities(), {self.products[0].id: 2, self.products[1].id: 1})
+
+        self.store.flush(self.user.id)
+        self.assertEqual(self.stored_quantities(), {self.products[0].id: 5, self.products[1].id: 1})
+
+    def test_responses_match_the_database_path(self):
+        self.add(self.products[0], 2)
+        cart = self.add(self.products[1], 4)
+        item_id = next(item['id'] for item in cart['items'] if item['product']['id'] == self.products[1].id)
+
+        response = self.client.patch(f'/api/cart/items/{item_id}/update/', {'quantity': 7}, format='json')
+        self.assertEqual(response.status_code, 200)
+        cart = self.client.get('/api/cart/').json()
+        self.assertEqual(cart['total_quantity'], 9)
+
+        self.store.flush(self.user.id)
+        with self.settings(CART_STORE='database'):
+            self.assertEqual(self.client.get('/api/cart/').json(), cart)
+
+    def test_remove_and_clear(self):
+        cart = self.add(self.products[0], 2)
+        self.add(self.products[1], 1)
+        response = self.client.delete(f"/api/cart/items/{cart['items'][0]['id']}/remove/")
+        self.assertEqual([item['product']['id'] for item in response.json()['items']], [self.products[1].id])
+        self.assertEqual(self.client.delete('/api/cart/items/999999/remove/').status_code, 404)
+
+        self.store.flush(self.user.id)
+        self.assertEqual(self.stored_quantities(), {self.products[1].id: 1})
+
+        self.assertEqual(self.client.delete('/api/cart/clear/').json()['items'], [])
+        self.assertEqual(self.client.get('/api/cart/summary/').json()['item_count'], 0)
+        self.store.flush(self.user.id)
+        self.assertEqual(self.stored_quantities(), {})
+
+        self.add(self.products[0], 1)
+        self.store.flush_dirty()
+        self.assertEqual(self.stored_quantities(), {self.products[0].id: 1})
+
+    def test_line_removed_since_the_last_flush_is_reused(self):
+        cart = self.add(self.products[0], 2)
+        self.store.flush(self.user.id)
+        item_id = cart['items'][0]['id']
+
+        # Removed in the store only; the CartItem row is still there
+        self.client.delete(f'/api/cart/items/{item_id}/remove/')
+        cart = self.add(self.products[0], 1)
+        self.assertEqual([(item['id'], item['quantity']) for item in cart['items']], [(item_id, 1)])
+
+        self.store.flush(self.user.id)
+        self.assertEqual(
+            list(CartItem.objects.filter(cart__user=self.user).values_list('id', 'quantity')), [(item_id, 1)]
+        )
+
+    def test_increment_is_one_query(self):
+        self.add(self.products[0], 1)
+        with self.assertNumQueries(1):
+            self.add(self.products[0], 1)
+        # Only the check that the products still exist
+        with self.assertNumQueries(1):
+            summary = self.client.get('/api/cart/summary/').json()
+        self.assertEqual(summary, {'total_items': 2, 'total_quantity': 2.0, 'item_count': 1})
+
+    def test_lines_of_deleted_products_are_dropped(self):
+        self.add(self.products[0], 2)
+        self.add(self.products[2], 1)
+        self.store.flush(self.user.id)
+        self.add(self.products[2], 1)
+        Product.objects.filter(id=self.products[2].id).delete()
+
+        cart = self.client.get('/api/cart/').json()
+        summary = self.client.get('/api/cart/summary/').json()
+        self.assertEqual(len(cart['items']), summary['item_count'])
+        self.assertEqual((cart['total_quantity'], summary['total_quantity']), (2, 2.0))
+
+        self.store.flush(self.user.id)
+        self.assertEqual(self.stored_quantities(), {self.products[0].id: 2})
+        self.assertEqual([line['product_id'] for line in self.store.snapshot(self.user.id).lines], [self.products[0].id])
+
+    def test_failed_flush_keeps_the_cart_dirty(self):
+        self.add(self.products[0], 1)
+        self.add(self.products[0], 1)
+        with mock.patch.object(CartItem.objects, 'bulk_update', side_effect=DatabaseError('deadlock')):
+            with self.assertRaises(DatabaseError):
+                self.store.flush(self.user.id)
+        self.assertEqual(self.store.client.smembers(DIRTY_KEY), {str(self.user.id)})
+
+        self.assertEqual(self.store.flush_dirty(), 1)
+        self.assertEqual(self.stored_quantities(), {self.products[0].id: 2})
+
+    def test_sweep_continues_past_a_failing_cart(self):
+        self.store.client.sadd(DIRTY_KEY, 1, 2)
+        with mock.patch.object(self.store, 'flush', side_effect=[DatabaseError('lost connection'), 0]) as flush:
+            with self.assertLogs('cart.store', 'ERROR'):
+                self.assertEqual(self.store.flush_dirty(), 1)
+        self.assertEqual(flush.call_count, 2)
+
+    def test_unknown_product(self):
+        response = self.client.post('/api/cart/add/', {'product_id': 999999, 'quantity': 1}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_one_flush_scheduled_per_dirty_cart(self):
+        with self.settings(CART_STORE_FLUSH_DELAY=5.0):
+            store = get_cart_store()
+            store.client.flushall()
+            with mock.patch.object(LocalCartStore, 'enqueue_flush') as enqueue_flush:
+                self.add(self.products[0], 1)
+                self.add(self.products[0], 1)
+                enqueue_flush.assert_called_once_with(self.user.id)
+
+                store.flush(self.user.id)
+                self.add(self.products[0], 1)
+                self.assertEqual(enqueue_flush.call_count, 2)
+
+    def test_checkout_flushes_the_cart(self):
+        self.add(self.products[0], 2)
+        self.add(self.products[0], 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/orders/create/', {
+                'delivery_address': '1 Main St',
+                'business_name': 'Curry House',
+                'contact_person': 'Sam',
+                'phone_number': '5550100',
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+
+        order = Order.objects.get(customer=self.user)
+        self.assertEqual(order.total_items, 5)
+        self.assertEqual(list(order.items.values_list('product_id', 'quantity')), [(self.products[0].id, 5)])
+        self.assertIsNone(self.store.snapshot(self.user.id))
+        self.assertEqual(self.client.get('/api/cart/').json()['items'], [])
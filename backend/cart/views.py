@@ -4,20 +4,48 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from django.db import transaction
+from django.db.models import Prefetch
 from .models import Cart, CartItem
 from .serializers import (
     CartSerializer, CartItemSerializer, 
     AddToCartSerializer, UpdateCartItemSerializer
 )
+from .store import get_cart_store
 from products.models import Product
 
 
+def carts_for_response():
+    """
+    Carts with everything CartSerializer reads, in two queries.
+    
+    The items come with their product and category joined in, and the
+    cart totals are taken from the prefetched items.
+    """
+    return Cart.objects.prefetch_related(
+        Prefetch('items', queryset=CartItem.objects.select_related('product__category'))
+    )
+
+
+def load_cart(cart_id):
+    """Re-read a cart for the response after its items changed"""
+    return carts_for_response().get(pk=cart_id)
+
+
+def store_cart_response(store, state, products=None):
+    """Render a hot cart store state like a database cart"""
+    return Response(CartSerializer(store.build_cart(state, products)).data)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_cart(request):
     """Get user's current cart with all items"""
     try:
-        cart, created = Cart.objects.get_or_create(
+        store = get_cart_store()
+        if store is not None:
+            return store_cart_response(store, store.load(request.user.id))
+        
+        cart, created = carts_for_response().get_or_create(
             user=request.user,
             is_active=True,
             defaults={'user': request.user}
@@ -41,6 +69,23 @@ def add_to_cart(request):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     try:
+        store = get_cart_store()
+        if store is not None:
+            product_id = serializer.validated_data['product_id']
+            state = store.load(request.user.id)
+            # The added product and the ones already in the cart, in one query
+            products = Product.objects.select_related('category').in_bulk(
+                [line['product_id'] for line in state.lines] + [product_id]
+            )
+            product = products.get(product_id)
+            if product is None or not product.is_active:
+                return Response(
+                    {'error': 'Product not found'}, 
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            state = store.add(request.user.id, product_id, serializer.validated_data['quantity'])
+            return store_cart_response(store, state, products)
+        
         with transaction.atomic():
             # Get or create user's cart
             cart, created = Cart.objects.get_or_create(
@@ -67,11 +112,8 @@ def add_to_cart(request):
                 cart_item.quantity += quantity
                 cart_item.save()
             
-            # Refresh cart to get updated totals
-            cart.refresh_from_db()
-            
             # Return updated cart
-            cart_serializer = CartSerializer(cart)
+            cart_serializer = CartSerializer(load_cart(cart.pk))
             return Response(cart_serializer.data, status=status.HTTP_200_OK)
             
     except Product.DoesNotExist:
@@ -95,6 +137,16 @@ def update_cart_item(request, item_id):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     try:
+        store = get_cart_store()
+        if store is not None:
+            state = store.set_quantity(request.user.id, item_id, serializer.validated_data['quantity'])
+            if state is None:
+                return Response(
+                    {'error': 'Cart item not found'}, 
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            return store_cart_response(store, state)
+        
         # Get cart item and verify ownership
         cart_item = get_object_or_404(
             CartItem, 
@@ -108,9 +160,7 @@ def update_cart_item(request, item_id):
         cart_item.save()
         
         # Return updated cart
-        cart = cart_item.cart
-        cart.refresh_from_db()
-        cart_serializer = CartSerializer(cart)
+        cart_serializer = CartSerializer(load_cart(cart_item.cart_id))
         return Response(cart_serializer.data)
         
     except CartItem.DoesNotExist:
@@ -130,6 +180,16 @@ def update_cart_item(request, item_id):
 def remove_from_cart(request, item_id):
     """Remove an item from the user's cart"""
     try:
+        store = get_cart_store()
+        if store is not None:
+            state = store.remove(request.user.id, item_id)
+            if state is None:
+                return Response(
+                    {'error': 'Cart item not found'}, 
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            return store_cart_response(store, state)
+        
         # Get cart item and verify ownership
         cart_item = get_object_or_404(
             CartItem, 
@@ -138,12 +198,11 @@ def remove_from_cart(request, item_id):
             cart__is_active=True
         )
         
-        cart = cart_item.cart
+        cart_id = cart_item.cart_id
         cart_item.delete()
         
         # Return updated cart
-        cart.refresh_from_db()
-        cart_serializer = CartSerializer(cart)
+        cart_serializer = CartSerializer(load_cart(cart_id))
         return Response(cart_serializer.data)
         
     except CartItem.DoesNotExist:
@@ -163,6 +222,16 @@ def remove_from_cart(request, item_id):
 def clear_cart(request):
     """Clear all items from the user's cart"""
     try:
+        store = get_cart_store()
+        if store is not None:
+            state = store.clear(request.user.id)
+            if state is None:
+                return Response(
+                    {'error': 'Cart not found'}, 
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            return store_cart_response(store, state)
+        
         cart = get_object_or_404(
             Cart, 
             user=request.user, 
@@ -173,8 +242,7 @@ def clear_cart(request):
         cart.items.all().delete()
         
         # Return empty cart
-        cart.refresh_from_db()
-        cart_serializer = CartSerializer(cart)
+        cart_serializer = CartSerializer(load_cart(cart.pk))
         return Response(cart_serializer.data)
         
     except Cart.DoesNotExist:
@@ -194,26 +262,32 @@ def clear_cart(request):
 def cart_summary(request):
     """Get a summary of the user's cart (counts and totals)"""
     try:
-        cart = get_object_or_404(
-            Cart, 
-            user=request.user, 
-            is_active=True
-        )
+        store = get_cart_store()
+        if store is not None:
+            counts = store.summary(request.user.id)
+            totals = counts and {'items_count': counts[0], 'items_quantity': counts[1]}
+        else:
+            # One grouped query over the user's active cart and its items
+            totals = Cart.objects.filter(
+                user=request.user,
+                is_active=True
+            ).with_totals().values('items_count', 'items_quantity').first()
+        
+        if totals is None:
+            return Response({
+                'total_items': 0,
+                'total_quantity': 0.0,
+                'item_count': 0
+            })
         
         summary = {
-            'total_items': cart.total_items,
-            'total_quantity': float(cart.total_quantity),
-            'item_count': cart.items.count()
+            'total_items': totals['items_quantity'],
+            'total_quantity': float(totals['items_quantity']),
+            'item_count': totals['items_count']
         }
         
         return Response(summary)
         
-    except Cart.DoesNotExist:
-        return Response({
-            'total_items': 0,
-            'total_quantity': 0.0,
-            'item_count': 0
-        })
     except Exception as e:
         return Response(
             {'error': 'Failed to get cart summary'}, 
@@ -44,6 +44,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     # Third party apps
     'rest_framework',
@@ -149,6 +150,37 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20,
 }
 
+# Serialize product, cart item and order item lists without DRF Field objects
+# (see products.serializers); `manage.py benchmark_serializers` checks parity
+FAST_READ_SERIALIZERS = env.bool('FAST_READ_SERIALIZERS', default=False)
+
+# Product catalog settings
+# Minimum pg_trgm word similarity for ?mode=fuzzy on /api/products/search/
+PRODUCT_FUZZY_SEARCH_THRESHOLD = env.float('PRODUCT_FUZZY_SEARCH_THRESHOLD', default=0.4)
+# Seconds between catalog version checks for the in-process suggest index
+PRODUCT_SUGGEST_VERSION_CHECK_INTERVAL = env.float('PRODUCT_SUGGEST_VERSION_CHECK_INTERVAL', default=5.0)
+# Brand dictionary used by import_catalog to tag products (see products.classifier)
+PRODUCT_BRANDS_FILE = env('PRODUCT_BRANDS_FILE', default=str(BASE_DIR / 'catalog_data' / 'brands.json'))
+# Supplier catalog read by import_catalog and benchmark_classifier by default
+PRODUCT_CATALOG_CSV_FILE = env(
+    'PRODUCT_CATALOG_CSV_FILE', default=str(BASE_DIR / 'catalog_data' / 'CompleteCatalog.csv')
+)
+# Rendered search responses kept per process; 0 disables the cache
+PRODUCT_SEARCH_CACHE_SIZE = env.int('PRODUCT_SEARCH_CACHE_SIZE', default=1000)
+# Tokens accepted in the X-Partner-Token header by /api/products/export/
+PRODUCT_EXPORT_PARTNER_TOKENS = env.list('PRODUCT_EXPORT_PARTNER_TOKENS', default=[])
+
+# Cart storage: 'database' serves carts from Cart/CartItem directly; 'redis'
+# keeps active carts in Redis hashes and writes them back asynchronously
+# (see cart.store); 'memory' is an in-process stand-in for 'redis' that only
+# works with a single server process (development and tests)
+CART_STORE = env('CART_STORE', default='database')
+CART_STORE_REDIS_URL = env('CART_STORE_REDIS_URL', default=env('REDIS_URL', default='redis://redis:6379/0'))
+# Seconds before a changed cart is written back to the database
+CART_STORE_FLUSH_DELAY = env.float('CART_STORE_FLUSH_DELAY', default=5.0)
+# Seconds an untouched cart stays in Redis
+CART_STORE_TTL = env.int('CART_STORE_TTL', default=24 * 60 * 60)
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = env.list('CORS_ALLOWED_ORIGINS')
 CORS_ALLOW_CREDENTIALS = True
@@ -193,3 +225,11 @@ CELERY_TIMEZONE = TIME_ZONE
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutes
 CELERY_TASK_SOFT_TIME_LIMIT = 25 * 60  # 25 minutes
+CELERY_BEAT_SCHEDULE = {}
+if CART_STORE != 'database':
+    # Safety net for cart write-backs whose flush_cart task was lost; carts
+    # kept in the database only have nothing to write back
+    CELERY_BEAT_SCHEDULE['flush-dirty-carts'] = {
+        'task': 'cart.tasks.flush_dirty_carts',
+        'schedule': 60.0,
+    }
@@ -1,6 +1,9 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import Order, OrderItem
-from products.serializers import ProductListSerializer
+from products.serializers import (
+    FastRepresentationMixin, ProductListSerializer, product_list_representation
+)
 from users.serializers import UserProfileSerializer
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -18,6 +21,16 @@ class OrderItemSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Quantity must be at least 1")
         return value
 
+class OrderItemFastSerializer(FastRepresentationMixin, serializers.BaseSerializer):
+    """Read-only fast path for OrderItemSerializer (see FAST_READ_SERIALIZERS)"""
+    
+    def to_representation(self, item):
+        return {
+            'id': item.id,
+            'product': product_list_representation(item.product, categories=self.categories),
+            'quantity': item.quantity,
+        }
+
 class OrderSerializer(serializers.ModelSerializer):
     """Serializer for orders"""
     items = OrderItemSerializer(many=True, read_only=True)
@@ -38,6 +51,12 @@ class OrderSerializer(serializers.ModelSerializer):
             'id', 'order_number', 'customer', 'created_at', 'updated_at',
             'status_display', 'can_cancel'
         ]
+    
+    def get_fields(self):
+        fields = super().get_fields()
+        if settings.FAST_READ_SERIALIZERS:
+            fields['items'] = OrderItemFastSerializer(many=True, read_only=True)
+        return fields
 
 class CreateOrderSerializer(serializers.Serializer):
     """Serializer for creating new orders"""
@@ -18,6 +18,7 @@ from .utils import CSVGenerator
 from .email_service import EmailService
 from .order_processor import OrderProcessor
 from cart.models import Cart
+from cart.store import get_cart_store
 from products.models import Product
 
 @api_view(['POST'])
@@ -25,6 +26,11 @@ from products.models import Product
 def create_order(request):
     """Create a new order from user's cart"""
     try:
+        # Carts held in the hot cart store are written back before checkout
+        cart_store = get_cart_store()
+        if cart_store is not None:
+            cart_store.flush(request.user.id)
+        
         # Get user's active cart
         cart = Cart.objects.filter(user=request.user, is_active=True).first()
         if not cart or not cart.items.exists():
@@ -69,6 +75,9 @@ def create_order(request):
             cart.clear()
             cart.is_active = False
             cart.save()
+            if cart_store is not None:
+                user_id = request.user.id
+                transaction.on_commit(lambda: cart_store.discard(user_id))
             
             # Send email notifications
             try:
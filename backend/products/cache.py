@@ -0,0 +1,254 @@
+"""
+Caching for catalog read endpoints.
+
+Every Product or Category write bumps the CatalogVersion counter and
+invalidates cached values through the signal handlers in products.signals,
+so cached data can be kept for a long time. Bulk writes that bypass signals
+(queryset.update, bulk_create) must clear catalog_version and call
+schedule_catalog_changed() themselves.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django.views.decorators.http import condition
+
+from .models import CatalogVersion, Category, Product
+from .serializers import ProductListSerializer, sparse_params_key
+
+PRODUCT_STATS_CACHE_KEY = 'products:stats'
+PRODUCT_STATS_CACHE_TIMEOUT = 60 * 60  # safety net; writes invalidate it
+
+CATALOG_VERSION_CACHE_KEY = 'products:catalog_version'
+CATALOG_VERSION_CACHE_TIMEOUT = 60 * 60
+
+# Keys embed the catalog version, so stale entries are never read again
+FEATURED_PRODUCTS_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def get_catalog_version():
+    """
+    Return the current catalog ``(version, updated_at)``.
+
+    Served from the cache when possible; falls back to the CatalogVersion row.
+    """
+    state = cache.get(CATALOG_VERSION_CACHE_KEY)
+    if state is None:
+        catalog, created = CatalogVersion.objects.get_or_create(pk=1)
+        state = (catalog.version, catalog.updated_at)
+        # add() rather than set(), so a value read before a concurrent bump
+        # can't overwrite the version that bump published
+        cache.add(CATALOG_VERSION_CACHE_KEY, state, CATALOG_VERSION_CACHE_TIMEOUT)
+    return state
+
+
+def bump_catalog_version():
+    """
+    Increment the catalog version and publish it to the cache.
+
+    Committed rows that no version has published yet are stamped with the
+    new one for the changes feed. The row stays locked until the new version
+    is in the cache, so concurrent bumps publish their versions in order.
+    """
+    try:
+        with transaction.atomic():
+            catalog, created = CatalogVersion.objects.select_for_update().get_or_create(pk=1)
+            if not created:
+                catalog.version += 1
+                catalog.save(update_fields=['version', 'updated_at'])
+            for model in (Category, Product):
+                model.objects.filter(catalog_version__isnull=True).update(catalog_version=catalog.version)
+            state = (catalog.version, catalog.updated_at)
+            cache.set(CATALOG_VERSION_CACHE_KEY, state, CATALOG_VERSION_CACHE_TIMEOUT)
+    except Exception:
+        # Don't leave a version that never committed in the cache
+        cache.delete(CATALOG_VERSION_CACHE_KEY)
+        raise
+    return state
+
+
+def featured_products_cache_key(version, category_id, request):
+    """
+    Cache key for the rendered featured list of one catalog version.
+
+    Only the normalized sparse fieldset parameters go into the key, so
+    clients can't create arbitrary keys through the query string.
+    """
+    representation = sparse_params_key(request.query_params, ProductListSerializer)
+    return f'products:featured:v{version}:{category_id or "all"}:{representation}'
+
+
+class SearchResultCache:
+    """
+    Per-process LRU of rendered search responses for one catalog version.
+
+    Entries are dropped as soon as a different catalog version is seen, and
+    the least recently used entry is evicted once ``maxsize`` is reached.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.version = None
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, version, key):
+        if self.maxsize <= 0:
+            # Disabled; don't count misses that no entry could ever serve
+            return None
+        with self.lock:
+            if version != self.version:
+                self.entries.clear()
+                self.version = version
+
+            content = self.entries.get(key)
+            if content is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return content
+
+    def set(self, version, key, content):
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            if version != self.version:
+                return
+            self.entries[key] = content
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'size': len(self.entries),
+                'maxsize': self.maxsize,
+                'version': self.version,
+            }
+
+
+search_result_cache = SearchResultCache(settings.PRODUCT_SEARCH_CACHE_SIZE)
+
+
+def search_result_cache_key(request):
+    """
+    Cache key for a search request, or None if it has no search term.
+
+    The term is lowercased and whitespace-collapsed (every search backend is
+    case-insensitive) and the remaining non-empty parameters are sorted, so
+    equivalent requests share an entry.
+    """
+    params = request.query_params
+    search = ' '.join(params.get('search', '').lower().split())
+    if not search:
+        return None
+
+    normalized = sorted(
+        (name, value)
+        for name, values in params.lists() if name != 'search'
+        for value in values if value != ''
+    )
+    # Pagination links are absolute, so the host is part of the key
+    return (request.get_host(), request.path, search, tuple(normalized))
+
+
+def catalog_etag(request, *args, **kwargs):
+    version, updated_at = get_catalog_version()
+    return f'"catalog-{version}"'
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    version, updated_at = get_catalog_version()
+    return updated_at
+
+
+# Answers If-None-Match / If-Modified-Since with a 304 before the view runs
+catalog_conditional = condition(
+    etag_func=catalog_etag,
+    last_modified_func=catalog_last_modified
+)
+
+
+def compute_product_stats():
+    """Compute the catalog statistics in a single grouped query"""
+    rows = Category.objects.values('name', 'is_active').annotate(
+        product_count=Count('products', filter=Q(products__is_active=True)),
+        in_stock_count=Count(
+            'products',
+            filter=Q(products__is_active=True, products__in_stock=True)
+        ),
+        low_stock_count=Count(
+            'products',
+            filter=Q(products__is_active=True, products__stock_quantity__lte=10)
+        ),
+    ).order_by('name')
+
+    stats = {
+        'total_products': 0,
+        'total_categories': 0,
+        'in_stock_products': 0,
+        'low_stock_products': 0,
+        'category_breakdown': [],
+    }
+
+    for row in rows:
+        # Every product has a category, so the per-category counts add up
+        # to the catalog totals
+        stats['total_products'] += row['product_count']
+        stats['in_stock_products'] += row['in_stock_count']
+        stats['low_stock_products'] += row['low_stock_count']
+
+        if row['is_active']:
+            stats['total_categories'] += 1
+            if row['product_count'] > 0:
+                stats['category_breakdown'].append({
+                    'category': row['name'],
+                    'product_count': row['product_count']
+                })
+
+    return stats
+
+
+def get_product_stats():
+    """Return the catalog statistics, computing and caching them on a miss"""
+    stats = cache.get(PRODUCT_STATS_CACHE_KEY)
+    if stats is None:
+        stats = compute_product_stats()
+        cache.set(PRODUCT_STATS_CACHE_KEY, stats, PRODUCT_STATS_CACHE_TIMEOUT)
+    return stats
+
+
+def invalidate_catalog_caches():
+    """Drop cached catalog data after products or categories change"""
+    cache.delete(PRODUCT_STATS_CACHE_KEY)
+
+
+def catalog_changed():
+    """Record a committed catalog write: bump the version and drop caches"""
+    bump_catalog_version()
+    invalidate_catalog_caches()
+
+
+def schedule_catalog_changed(using=None):
+    """
+    Run catalog_changed() once the current transaction commits.
+
+    Any number of writes in one transaction share a single bump. Outside a
+    transaction it runs right away.
+    """
+    connection = transaction.get_connection(using)
+    if any(func is catalog_changed for savepoint_ids, func, robust in connection.run_on_commit):
+        return
+    transaction.on_commit(catalog_changed, using)
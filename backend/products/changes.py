@@ -0,0 +1,153 @@
+"""
+Delta sync feed for catalog clients.
+
+Products and categories are read in (catalog_version, id) order from a
+cursor returned by the previous call, so a sync only touches rows that
+changed. Every write clears the row's catalog_version and the version bump
+that runs after the write commits stamps it again (see products.cache).
+Versions are stamped in commit order, so a row committed late by a long
+transaction still lands after the cursor of a client that polled meanwhile.
+
+Deactivated rows are returned as tombstones. Rows removed with a hard
+delete are not reported; deactivate products instead of deleting them.
+
+Writes that bypass Model.save() (queryset.update, bulk_update, bulk_create
+with update_conflicts) must clear catalog_version themselves or they are
+missed here.
+"""
+import json
+import re
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, timezone as dt_timezone
+
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from .models import CatalogVersion, Category, Product
+
+CHANGES_DEFAULT_LIMIT = 500
+CHANGES_MAX_LIMIT = 2000
+
+# A '+' in an unencoded query string arrives as a space
+UNENCODED_OFFSET = re.compile(r'(\d{2}:\d{2}[\d:.]*) (\d{2}(?::?\d{2})?)$')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(position):
+    """Encode ``{'products': (catalog_version, id), 'categories': (catalog_version, id)}``"""
+    data = {key: [version, pk] for key, (version, pk) in position.items()}
+    return urlsafe_b64encode(json.dumps(data).encode('utf-8')).decode('ascii')
+
+
+def parse_timestamp(since):
+    """Parse an ISO 8601 ``since`` value; returns None for anything else"""
+    since = UNENCODED_OFFSET.sub(r'\1+\2', since)
+    try:
+        updated_at = datetime.fromisoformat(since)
+    except ValueError:
+        return None
+    if timezone.is_naive(updated_at):
+        updated_at = timezone.make_aware(updated_at, dt_timezone.utc)
+    return updated_at
+
+
+def timestamp_position(queryset, updated_at):
+    """
+    Position of the first version that published a row written at or after
+    ``updated_at``.
+
+    Rows of that version written earlier are returned again; clients apply
+    changes by id, so that is harmless.
+    """
+    version = queryset.filter(updated_at__gte=updated_at).aggregate(
+        version=Min('catalog_version')
+    )['version']
+    if version is None:
+        # Nothing published since then; later writes get a newer version
+        version = CatalogVersion.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+    return (version, 0)
+
+
+def decode_cursor(since):
+    """
+    Decode a ``since`` value into a cursor position.
+
+    Accepts a cursor from a previous response, a catalog version number or
+    an ISO 8601 timestamp, with a ``Z`` or URL-encoded ``+HH:MM`` offset. A
+    version returns the rows it published and everything after. Digits are
+    always read as a version, never as a basic-format date like 20261017. An
+    empty value starts from the beginning (a full sync).
+    """
+    if not since:
+        return {'products': (0, 0), 'categories': (0, 0)}
+
+    if since.isascii() and since.isdigit():
+        version = int(since)
+        return {'products': (version, 0), 'categories': (version, 0)}
+
+    updated_at = parse_timestamp(since)
+    if updated_at is not None:
+        return {
+            'products': timestamp_position(Product.objects.all(), updated_at),
+            'categories': timestamp_position(Category.objects.all(), updated_at),
+        }
+
+    try:
+        data = json.loads(urlsafe_b64decode(since.encode('ascii')))
+        position = {}
+        for key in ('products', 'categories'):
+            version, pk = data[key]
+            if type(version) is not int or type(pk) is not int or version < 0 or pk < 0:
+                raise ValueError
+            position[key] = (version, pk)
+        return position
+    except (TypeError, ValueError, KeyError, UnicodeError):
+        raise InvalidCursor('Invalid cursor')
+
+
+def changed_since(queryset, position, limit):
+    """Return up to ``limit`` published rows after ``position`` and whether more follow"""
+    version, pk = position
+    # The redundant catalog_version__gte gives the planner an index range
+    # start; it also skips rows no version has published yet
+    queryset = queryset.filter(catalog_version__gte=version).filter(
+        Q(catalog_version__gt=version) | Q(catalog_version=version, id__gt=pk)
+    )
+
+    rows = list(queryset.order_by('catalog_version', 'id')[:limit + 1])
+    return rows[:limit], len(rows) > limit
+
+
+def get_changes(position, limit):
+    """
+    Collect product and category changes after ``position``.
+
+    Returns a dict with the changed active rows, deactivated ids, the cursor
+    for the next call and whether more changes are waiting.
+    """
+    products, more_products = changed_since(
+        Product.objects.select_related('category'), position['products'], limit
+    )
+    categories, more_categories = changed_since(
+        Category.objects.all(), position['categories'], limit
+    )
+
+    next_position = dict(position)
+    if products:
+        next_position['products'] = (products[-1].catalog_version, products[-1].id)
+    if categories:
+        next_position['categories'] = (categories[-1].catalog_version, categories[-1].id)
+
+    return {
+        'products': [product for product in products if product.is_active],
+        'categories': [category for category in categories if category.is_active],
+        'deleted': {
+            'products': [product.id for product in products if not product.is_active],
+            'categories': [category.id for category in categories if not category.is_active],
+        },
+        'next': encode_cursor(next_position),
+        'has_more': more_products or more_categories,
+    }
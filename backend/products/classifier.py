@@ -0,0 +1,117 @@
+"""
+Unit and brand extraction for catalog item names.
+
+Supplier item names look like ``GM BASMATI RICE 4X10LB`` or
+``CLAY DIYA 12/CS``. The unit comes from the first measured quantity in the
+name (``10LB``, ``200G``, ``5.5 L``); names without one fall back to a
+packaging word (pack, then piece, then case/box). Brands are matched as
+whole words against a dictionary loaded from PRODUCT_BRANDS_FILE, with the
+leftmost match winning.
+
+All patterns are compiled once at import (the brand pattern once per
+classifier), and the importer classifies names in batches with
+classify_many().
+"""
+import json
+import re
+from functools import lru_cache
+
+from django.conf import settings
+
+DEFAULT_UNIT = 'unit'
+
+# Spellings seen on supplier sheets, by the unit stored on the product
+MEASURE_ALIASES = {
+    'lb': ['LB', 'LBS', 'POUND', 'POUNDS'],
+    'kg': ['KG', 'KGS', 'KILO', 'KILOS'],
+    'g': ['G', 'GM', 'GMS', 'GR', 'GRAM', 'GRAMS'],
+    'oz': ['OZ'],
+    'ml': ['ML'],
+    'l': ['L', 'LTR', 'LTRS', 'LITRE', 'LITRES', 'LITER', 'LITERS'],
+    'gal': ['GAL', 'GALLON', 'GALLONS'],
+}
+
+# In priority order: a name that mentions both packs and cases is sold by the pack
+PACKAGE_ALIASES = {
+    'pack': ['PACK', 'PACKS', 'PKT', 'PKTS', 'PKG', 'PKGS', 'PACKET', 'PACKETS'],
+    'piece': ['PC', 'PCS', 'PIECE', 'PIECES'],
+    'box': ['BOX', 'BOXES', 'BX', 'CS', 'CASE', 'CASES', 'CTN'],
+}
+
+
+def alias_map(aliases):
+    return {alias: unit for unit, words in aliases.items() for alias in words}
+
+
+def alternation(words):
+    """Regex alternation that prefers the longest word (``LBS`` over ``LB``)"""
+    return '|'.join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+
+
+MEASURE_UNITS = alias_map(MEASURE_ALIASES)
+
+# A number directly followed by a unit: 10LB, 4X10LB, 7.5gm, 5.5 L
+MEASURE_RE = re.compile(
+    r'\d+(?:\.\d+)?[ \t]*(' + alternation(MEASURE_UNITS) + r')(?![A-Za-z])', re.IGNORECASE
+)
+PACKAGE_RES = {
+    unit: re.compile(r'(?<![A-Za-z])(' + alternation(words) + r')(?![A-Za-z])', re.IGNORECASE)
+    for unit, words in PACKAGE_ALIASES.items()
+}
+
+
+def load_brands(path):
+    """Read the brand dictionary (a JSON list of names)"""
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+class CatalogClassifier:
+    """Extracts the unit and brand from catalog item names"""
+
+    def __init__(self, brands):
+        self.brands = {brand.upper(): brand for brand in brands}
+        # One alternation over the whole dictionary; whole words only, so
+        # 'LG' does not match inside 'BULGUR'
+        brand_pattern = r'(?<![\w\'])(' + alternation(self.brands) + r')(?![\w\'])'
+        self.brand_re = re.compile(brand_pattern, re.IGNORECASE) if brands else None
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(load_brands(path))
+
+    def unit(self, name):
+        match = MEASURE_RE.search(name)
+        if match:
+            return MEASURE_UNITS[match.group(1).upper()]
+        for unit, pattern in PACKAGE_RES.items():
+            if pattern.search(name):
+                return unit
+        return DEFAULT_UNIT
+
+    def brand(self, name):
+        if self.brand_re is None:
+            return ''
+        match = self.brand_re.search(name)
+        return self.brands[match.group(1).upper()] if match else ''
+
+    def classify(self, name):
+        """Return ``(unit, brand)`` for one item name"""
+        return self.unit(name), self.brand(name)
+
+    def classify_many(self, names):
+        """
+        Return ``(unit, brand)`` for every name, in order.
+
+        Per-name searches with the precompiled patterns; scanning the batch
+        joined into one text measured slower in CPython (see
+        ``manage.py benchmark_classifier``).
+        """
+        unit, brand = self.unit, self.brand
+        return [(unit(name), brand(name)) for name in names]
+
+
+@lru_cache(maxsize=None)
+def get_classifier():
+    """The classifier for the configured brand dictionary, built once per process"""
+    return CatalogClassifier.from_file(settings.PRODUCT_BRANDS_FILE)
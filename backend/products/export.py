@@ -0,0 +1,78 @@
+"""
+Streaming full-catalog export for POS and partner syncs.
+
+Rows are read with ``QuerySet.iterator()``, which uses a server-side cursor
+on PostgreSQL, and are written out in small batches, so memory stays flat
+and the first bytes are sent before the whole catalog has been read.
+"""
+import csv
+import json
+
+from .models import Product
+from .serializers import format_datetime, format_decimal
+
+EXPORT_FIELDS = [
+    'id', 'item_code', 'name', 'description', 'category_id', 'category__name',
+    'brand', 'origin', 'unit', 'min_order_quantity', 'in_stock',
+    'stock_quantity', 'updated_at',
+]
+
+# Output column names; category__name is exported as 'category'
+EXPORT_COLUMNS = [
+    'category' if field == 'category__name' else field for field in EXPORT_FIELDS
+]
+
+EXPORT_CHUNK_SIZE = 2000
+
+# Rows per write to the response
+EXPORT_BATCH_SIZE = 500
+
+
+def export_rows(chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield active products as tuples in EXPORT_COLUMNS order, by id"""
+    rows = Product.objects.filter(is_active=True).order_by('id').values_list(*EXPORT_FIELDS)
+    decimal_positions = [
+        EXPORT_FIELDS.index('min_order_quantity'), EXPORT_FIELDS.index('stock_quantity')
+    ]
+    updated_at_position = EXPORT_FIELDS.index('updated_at')
+
+    for row in rows.iterator(chunk_size=chunk_size):
+        row = list(row)
+        for position in decimal_positions:
+            row[position] = format_decimal(row[position])
+        row[updated_at_position] = format_datetime(row[updated_at_position])
+        yield row
+
+
+def batched(lines, size=EXPORT_BATCH_SIZE):
+    """Join lines into larger chunks to avoid one write per row"""
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= size:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def stream_ndjson():
+    """Yield the catalog as newline-delimited JSON objects"""
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    return batched(
+        dumps(dict(zip(EXPORT_COLUMNS, row))) + '\n' for row in export_rows()
+    )
+
+
+class Echo:
+    """File-like object whose write() returns the value instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv():
+    """Yield the catalog as CSV, header first"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    yield from batched(writer.writerow(row) for row in export_rows())
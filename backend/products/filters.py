@@ -0,0 +1,15 @@
+from rest_framework import filters
+
+
+class RelevanceOrderingFilter(filters.OrderingFilter):
+    """
+    Ordering filter that leaves search results in relevance order.
+
+    The view's default ordering is only applied when the request isn't a
+    search; an explicit ``?ordering=`` still wins.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        if not request.query_params.get(self.ordering_param) and request.query_params.get('search', '').strip():
+            return None
+        return super().get_ordering(request, queryset, view)
@@ -0,0 +1,93 @@
+import csv
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from products.classifier import get_classifier
+
+ACCURACY_FIXTURE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'fixtures', 'classifier_accuracy.json'
+)
+
+
+def legacy_unit(item_name):
+    """The substring cascade import_catalog used before products.classifier"""
+    item_lower = item_name.lower()
+    for unit, words in [
+        ('lb', ['lb', 'pound']), ('kg', ['kg', 'kilo']), ('g', ['g', 'gram']),
+        ('ml', ['ml', 'liter', 'l']), ('oz', ['oz', 'ounce']), ('pack', ['pack', 'pkg']),
+        ('piece', ['piece', 'pc']), ('box', ['box', 'case']),
+    ]:
+        if any(word in item_lower for word in words):
+            return unit
+    return 'unit'
+
+
+def legacy_brand(item_name):
+    """The hardcoded brand scan import_catalog used before products.classifier"""
+    for brand in ['GM', 'QBV', 'LG', 'LIJJAT', 'HAPPY PANDA', 'MOTHER\'S PRIDE']:
+        if brand in item_name:
+            return brand
+    return ''
+
+
+class Command(BaseCommand):
+    help = 'Measure unit/brand classifier accuracy and throughput against the legacy importer logic'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--csv-file',
+            type=str,
+            help='Catalog CSV whose item names are classified',
+            default=settings.PRODUCT_CATALOG_CSV_FILE
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Number of timed runs per implementation (best run is reported)'
+        )
+
+    def handle(self, *args, **options):
+        classifier = get_classifier()
+
+        with open(ACCURACY_FIXTURE, 'r', encoding='utf-8') as file:
+            cases = json.load(file)['cases']
+
+        names = [case['name'] for case in cases]
+        expected = [(case['unit'], case['brand']) for case in cases]
+        labelled = [
+            ('legacy', [(legacy_unit(name), legacy_brand(name)) for name in names]),
+            ('classifier', classifier.classify_many(names)),
+        ]
+        self.stdout.write(f"Accuracy on {len(cases)} hand-labelled names (unit / brand / both):")
+        for label, labels in labelled:
+            pairs = list(zip(labels, expected))
+            units = sum(got[0] == want[0] for got, want in pairs) / len(cases)
+            brands = sum(got[1] == want[1] for got, want in pairs) / len(cases)
+            both = sum(got == want for got, want in pairs) / len(cases)
+            self.stdout.write(f"{label}: {units:.1%} / {brands:.1%} / {both:.1%}")
+
+        base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+        with open(os.path.join(base_dir, options['csv_file']), 'r', encoding='utf-8') as file:
+            names = [
+                row['item_description'].strip() for row in csv.DictReader(file)
+                if row.get('item_description', '').strip()
+            ]
+
+        runs = [
+            ('legacy', lambda: [(legacy_unit(name), legacy_brand(name)) for name in names]),
+            ('classifier', lambda: classifier.classify_many(names)),
+        ]
+        self.stdout.write(f"Classifying {len(names)} names, best of {options['repeat']} runs")
+        for label, run in runs:
+            best = None
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                run()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            self.stdout.write(f"{label}: {len(names) / best:,.0f} names/s")
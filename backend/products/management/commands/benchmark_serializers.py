@@ -0,0 +1,125 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from cart.models import CartItem
+from cart.serializers import CartItemFastSerializer, CartItemSerializer
+from orders.models import OrderItem
+from orders.serializers import OrderItemFastSerializer, OrderItemSerializer
+from products.models import Category, Product
+from products.serializers import ProductListFastSerializer, ProductListSerializer
+
+
+class Command(BaseCommand):
+    help = 'Check the fast read serializers against the DRF serializers and compare throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=1000,
+            help='Number of rows to serialize per run'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Number of timed runs per serializer (best run is reported)'
+        )
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        repeat = options['repeat']
+
+        products = self.build_products(rows)
+        now = timezone.now()
+        cart_items = [
+            CartItem(id=product.id, product=product, quantity=product.id % 7 + 1, added_at=now, updated_at=now)
+            for product in products
+        ]
+        order_items = [
+            OrderItem(id=product.id, product=product, quantity=product.id % 7 + 1)
+            for product in products
+        ]
+
+        # Serializers are benchmarked in-memory, so no database access is timed
+        factory = APIRequestFactory()
+        compact_request = Request(factory.get('/api/products/', {'compact': 'true'}))
+        fields_request = Request(factory.get('/api/products/', {'fields': 'id,name,category'}))
+
+        cases = [
+            ('ProductListSerializer', ProductListSerializer, ProductListFastSerializer, products, {}),
+            ('ProductListSerializer ?compact=true', ProductListSerializer, ProductListFastSerializer,
+             products, {'request': compact_request}),
+            ('ProductListSerializer ?fields=', ProductListSerializer, ProductListFastSerializer,
+             products, {'request': fields_request}),
+            ('CartItemSerializer', CartItemSerializer, CartItemFastSerializer, cart_items, {}),
+            ('OrderItemSerializer', OrderItemSerializer, OrderItemFastSerializer, order_items, {}),
+        ]
+
+        renderer = JSONRenderer()
+        self.stdout.write(f"Serializing {rows} rows, best of {repeat} runs")
+
+        for label, serializer_class, fast_class, objects, context in cases:
+            expected = renderer.render(serializer_class(objects, many=True, context=context).data)
+            actual = renderer.render(fast_class(objects, many=True, context=context).data)
+            if expected != actual:
+                raise CommandError(f"{label}: fast serializer output differs from the DRF serializer")
+
+            drf_time = self.time_serializer(serializer_class, objects, context, repeat)
+            fast_time = self.time_serializer(fast_class, objects, context, repeat)
+
+            self.stdout.write(
+                f"{label}: parity OK | "
+                f"DRF {rows / drf_time:,.0f} rows/s | "
+                f"fast {rows / fast_time:,.0f} rows/s | "
+                f"{drf_time / fast_time:.1f}x"
+            )
+
+        self.stdout.write(self.style.SUCCESS('Fast serializers match the DRF serializers'))
+
+    def build_products(self, rows):
+        """Build unsaved products covering the value types the serializers render"""
+        now = timezone.now()
+        category = Category(
+            id=1,
+            name='Grain Market',
+            slug='grain-market',
+            description='Products in the Grain Market category',
+            is_active=True,
+            created_at=now,
+            updated_at=now
+        )
+        return [
+            Product(
+                id=index,
+                item_code=str(10000 + index),
+                name=f'GM BASMATI RICE {index % 40 + 1}X10LB',
+                description='GM BASMATI RICE - Grain Market category',
+                category=category,
+                unit='lb',
+                min_order_quantity=Decimal('1.00'),
+                in_stock=index % 3 != 0,
+                stock_quantity=Decimal(index % 50) + Decimal('0.50'),
+                brand='GM' if index % 2 else '',
+                origin='India',
+                is_active=True,
+                created_at=now,
+                updated_at=now
+            )
+            for index in range(1, rows + 1)
+        ]
+
+    def time_serializer(self, serializer_class, objects, context, repeat):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            serializer_class(objects, many=True, context=context).data
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
@@ -1,10 +1,47 @@
-import csv
 import json
 import os
-from decimal import Decimal
-from django.core.management.base import BaseCommand
+import time
+from contextlib import nullcontext
+from decimal import ROUND_HALF_UP, Decimal
+from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
+from django.db import connection, connections, transaction
+from django.utils import timezone
+from products import cache, importer, sources
+from products.classifier import get_classifier
 from products.models import Category, Product
+from products.search import update_search_vectors
+
+# Fields an import overwrites on existing products; brand, origin and
+# is_active are only set when a product is first created. catalog_version is
+# cleared so the next version bump publishes the row to the changes feed.
+UPDATE_FIELDS = [
+    'name', 'description', 'category', 'unit', 'in_stock', 'stock_quantity', 'updated_at',
+    'catalog_version'
+]
+
+# Rows without stock info leave these alone on existing products
+STOCK_FIELDS = ['in_stock', 'stock_quantity']
+NO_STOCK_UPDATE_FIELDS = [field for field in UPDATE_FIELDS if field not in STOCK_FIELDS]
+
+# Fields compared against the stored product to detect a changed row;
+# STOCK_FIELDS must stay last
+FINGERPRINT_FIELDS = ['name', 'description', 'category_id', 'unit', *STOCK_FIELDS]
+
+TWO_PLACES = sources.TWO_PLACES
+
+# Phases timed for the import report
+PHASES = ['parse', 'classify', 'diff', 'write']
+
+# Where a dry run writes its report without --report. Settings modules print
+# banners to stdout, so it is not a clean channel for the JSON.
+DRY_RUN_REPORT = 'import_catalog_report.json'
+
+
+def fingerprint(values):
+    """Comparable form of FINGERPRINT_FIELDS values, stock at two decimal places"""
+    *values, stock_quantity = values
+    return (*values, Decimal(stock_quantity).quantize(TWO_PLACES, rounding=ROUND_HALF_UP))
 
 
 class Command(BaseCommand):
@@ -15,7 +52,7 @@ class Command(BaseCommand):
             '--csv-file',
             type=str,
             help='Path to the CSV catalog file',
-            default='../docs/catalog/completecatalog.csv'
+            default=settings.PRODUCT_CATALOG_CSV_FILE
         )
         parser.add_argument(
             '--json-file',
@@ -23,201 +60,552 @@ class Command(BaseCommand):
             help='Path to the JSON catalog file',
             default='../docs/catalog/catalog.json'
         )
+        parser.add_argument(
+            '--source',
+            action='append',
+            default=[],
+            help='Additional product source (CSV, or JSON with an "items" list) '
+                 'imported after the CSV file; repeat for several sheets'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Processes used to clean and classify rows; the default of 1 stays '
+                 'in process, which is faster unless the sources are very large'
+        )
         parser.add_argument(
             '--clear-existing',
             action='store_true',
             help='Clear existing products and categories before import'
         )
+        parser.add_argument(
+            '--deactivate-missing',
+            action='store_true',
+            help='Deactivate active products that are not in the CSV file'
+        )
+        parser.add_argument(
+            '--max-deactivate',
+            type=float,
+            default=0.25,
+            help='Largest share of the active products --deactivate-missing may '
+                 'deactivate; a larger share aborts the import unless --force is given'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Deactivate missing products even when the sources are empty or '
+                 'more than --max-deactivate of the catalog would go'
+        )
+        parser.add_argument(
+            '--engine',
+            choices=['orm', 'copy'],
+            default='orm',
+            help='Product ingestion engine; copy stages the CSV with COPY and '
+                 'merges it in SQL (PostgreSQL only, falls back to orm elsewhere)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of products per bulk insert/update statement'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Compute the changes against the database without writing anything'
+        )
+        parser.add_argument(
+            '--report',
+            type=str,
+            help='Write a JSON report of the changes and phase timings to this file '
+                 f'("-" for stdout; a dry run defaults to {DRY_RUN_REPORT})'
+        )
 
     def handle(self, *args, **options):
         csv_file = options['csv_file']
         json_file = options['json_file']
         clear_existing = options['clear_existing']
+        self.batch_size = options['batch_size']
+        self.deactivate_missing = options['deactivate_missing']
+        self.max_deactivate = options['max_deactivate']
+        self.force = options['force']
+        # Item codes written by this run, and whether any category was created
+        self.changed_item_codes = []
+        self.catalog_touched = False
+        # Set by the copy engine: every product it wrote has this updated_at
+        self.changed_since = None
+        # Source records without an item code, name or category
+        self.skipped_rows = []
+        self.workers = options['workers']
+        self.dry_run = options['dry_run']
+        self.timings = dict.fromkeys(PHASES, 0.0)
+        self.changes = {
+            'categories_new': [],
+            'products_new': [],
+            'products_changed': {},
+            'products_reactivated': [],
+            'products_deactivated': [],
+        }
+        self.summary = {}
+
+        if self.dry_run and clear_existing:
+            raise CommandError('--dry-run cannot be combined with --clear-existing')
+
+        report_path = options['report'] or (DRY_RUN_REPORT if self.dry_run else None)
+        # Progress output; with the report on stdout it moves to stderr
+        self.log = self.stderr if report_path == '-' else self.stdout
+
+        engine = options['engine']
+        if engine == 'copy' and connection.vendor != 'postgresql':
+            self.log.write(self.style.WARNING(
+                f"The copy engine needs PostgreSQL; using the orm engine on {connection.vendor}"
+            ))
+            engine = 'orm'
+        if engine == 'copy' and self.dry_run:
+            # The copy engine diffs inside its merge statements
+            self.log.write("Dry run: diffing with the orm engine")
+            engine = 'orm'
 
         # Get absolute paths
         base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
         csv_path = os.path.join(base_dir, csv_file)
         json_path = os.path.join(base_dir, json_file)
+        # Product sources in import order; later rows win on repeated item codes
+        self.sources = [csv_path] + [os.path.join(base_dir, path) for path in options['source']]
+
+        self.log.write(f"Starting catalog import...")
+        self.log.write(f"CSV file: {csv_path}")
+        self.log.write(f"JSON file: {json_path}")
+        for path in self.sources[1:]:
+            self.log.write(f"Source: {path}")
+
+        started = time.perf_counter()
+
+        with self.worker_pool() as self.executor, transaction.atomic():
+            if clear_existing:
+                self.log.write("Clearing existing products and categories...")
+                Product.objects.all().delete()
+                Category.objects.all().delete()
+                self.log.write("Existing data cleared.")
+
+            # Category name -> Category, shared by both import steps
+            self.categories = {category.name: category for category in Category.objects.all()}
+
+            # Import categories first
+            self.import_categories(json_path)
+            
+            # Import products
+            try:
+                if engine == 'copy':
+                    rows = self.copy_import_products()
+                else:
+                    rows = self.import_products()
+            except (OSError, ValueError) as e:
+                # Products are written as the sources stream in, so a bad
+                # source rolls back the whole import
+                raise CommandError(f"Error importing products: {str(e)}")
+
+            # Bulk writes skip the model signals, so refresh the search
+            # vectors and the catalog version here. An import that changed
+            # nothing leaves downstream caches alone.
+            write_started = time.perf_counter()
+            if self.changed_item_codes:
+                update_search_vectors(Product.objects.filter(item_code__in=self.changed_item_codes))
+            elif self.changed_since:
+                update_search_vectors(Product.objects.filter(updated_at=self.changed_since))
+            self.timings['write'] += time.perf_counter() - write_started
+            if self.changed_item_codes or self.catalog_touched or clear_existing:
+                cache.schedule_catalog_changed()
+
+        elapsed = time.perf_counter() - started
+        self.log.write(
+            f"Processed {rows} rows in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:,.0f} rows/s)"
+        )
+
+        if report_path:
+            report = json.dumps(self.build_report(engine, rows, elapsed), indent=2)
+            if report_path == '-':
+                self.stdout.write(report)
+            else:
+                with open(report_path, 'w', encoding='utf-8') as file:
+                    file.write(report + '\n')
+                self.log.write(f"Report written to {report_path}")
+
+        if self.dry_run:
+            self.log.write(self.style.SUCCESS('Dry run completed; nothing was written'))
+        else:
+            self.log.write(self.style.SUCCESS('Catalog import completed successfully!'))
+
+    def build_report(self, engine, rows, elapsed):
+        """Machine-readable summary of the run: counts, changed items and phase timings"""
+        timings = {phase: round(seconds, 4) for phase, seconds in self.timings.items()}
+        timings['total'] = round(elapsed, 4)
+        return {
+            'dry_run': self.dry_run,
+            'engine': engine,
+            'sources': self.sources,
+            'summary': dict(self.summary, rows=rows),
+            'categories': {'new': self.changes['categories_new']},
+            'products': {
+                'new': self.changes['products_new'],
+                'changed': [
+                    {'item_code': item_code, 'fields': fields}
+                    for item_code, fields in self.changes['products_changed'].items()
+                ],
+                'reactivated': self.changes['products_reactivated'],
+                'deactivated': self.changes['products_deactivated'],
+                'skipped': self.skipped_rows,
+            },
+            'timings': timings,
+            'rows_per_second': self.rows_per_second(rows, elapsed),
+        }
 
-        self.stdout.write(f"Starting catalog import...")
-        self.stdout.write(f"CSV file: {csv_path}")
-        self.stdout.write(f"JSON file: {json_path}")
+    def rows_per_second(self, rows, elapsed):
+        """Throughput per phase; the write rate counts only the products written"""
+        summary = self.summary
+        written = summary.get('new', 0) + summary.get('changed', 0)
+        written += summary.get('reactivated', 0) + summary.get('deactivated', 0)
+        counts = dict.fromkeys(PHASES, rows)
+        counts['write'] = written
+        rates = {
+            phase: round(counts[phase] / seconds) if counts[phase] and seconds else None
+            for phase, seconds in self.timings.items()
+        }
+        rates['total'] = round(rows / elapsed) if elapsed else None
+        return rates
 
-        if clear_existing:
-            self.stdout.write("Clearing existing products and categories...")
-            Product.objects.all().delete()
-            Category.objects.all().delete()
-            self.stdout.write("Existing data cleared.")
+    def create_categories(self, names):
+        """Bulk create the missing categories among ``names``"""
+        new_categories = []
+        for name in names:
+            if name in self.categories:
+                continue
+            # Create slug from name
+            slug = name.lower().replace(' ', '-').replace('&', 'and')
+            category = Category(
+                name=name,
+                slug=slug,
+                description=f'Products in the {name} category',
+                is_active=True
+            )
+            self.categories[name] = category
+            new_categories.append(category)
 
-        # Import categories first
-        self.import_categories(json_path)
-        
-        # Import products
-        self.import_products(csv_path)
+        if new_categories and not self.dry_run:
+            started = time.perf_counter()
+            Category.objects.bulk_create(new_categories)
+            # Not every backend returns primary keys from a bulk insert
+            created = Category.objects.filter(name__in=[category.name for category in new_categories])
+            self.categories.update({category.name: category for category in created})
+            self.timings['write'] += time.perf_counter() - started
+            for category in new_categories:
+                self.log.write(f"Created category: {category.name}")
+            self.catalog_touched = True
+        # In a dry run new categories stay unsaved, so their products diff as changed
+        self.changes['categories_new'].extend(category.name for category in new_categories)
 
-        self.stdout.write(self.style.SUCCESS('Catalog import completed successfully!'))
+        return len(new_categories)
 
     def import_categories(self, json_file_path):
         """Import categories from JSON file"""
         try:
-            with open(json_file_path, 'r', encoding='utf-8') as file:
-                data = json.load(file)
-                
-            categories_data = data.get('metadata', {}).get('categories', [])
+            # Reads just the metadata member, not the item list
+            metadata = sources.read_json_member(json_file_path, 'metadata', default={})
+            categories_data = metadata.get('categories', [])
             
-            for category_name in categories_data:
-                # Clean category name
-                clean_name = category_name.strip()
-                if clean_name:
-                    # Create slug from name
-                    slug = clean_name.lower().replace(' ', '-').replace('&', 'and')
-                    
-                    category, created = Category.objects.get_or_create(
-                        name=clean_name,
-                        defaults={
-                            'slug': slug,
-                            'description': f'Products in the {clean_name} category',
-                            'is_active': True
-                        }
-                    )
-                    
-                    if created:
-                        self.stdout.write(f"Created category: {clean_name}")
-                    else:
-                        self.stdout.write(f"Category already exists: {clean_name}")
+            # Clean category names
+            names = [name.strip() for name in categories_data if name.strip()]
+            created = self.create_categories(names)
+            self.log.write(f"Categories created: {created}, already existing: {len(set(names)) - created}")
                         
         except Exception as e:
-            self.stdout.write(self.style.ERROR(f"Error importing categories: {str(e)}"))
+            self.log.write(self.style.ERROR(f"Error importing categories: {str(e)}"))
 
-    def import_products(self, csv_file_path):
-        """Import products from CSV file"""
-        try:
-            with open(csv_file_path, 'r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                
-                products_created = 0
-                products_updated = 0
-                products_skipped = 0
-                
-                for row in reader:
-                    try:
-                        # Skip rows without essential data
-                        if not row.get('item_number') or not row.get('item_description'):
-                            products_skipped += 1
-                            continue
-                            
-                        item_code = row['item_number'].strip()
-                        item_name = row['item_description'].strip()
-                        category_name = row.get('product_category', '').strip()
-                        
-                        # Skip if no category
-                        if not category_name:
-                            products_skipped += 1
-                            continue
-                        
-                        # Get or create category
-                        try:
-                            category = Category.objects.get(name=category_name)
-                        except Category.DoesNotExist:
-                            # Create category if it doesn't exist
-                            slug = category_name.lower().replace(' ', '-').replace('&', 'and')
-                            category = Category.objects.create(
-                                name=category_name,
-                                slug=slug,
-                                description=f'Products in the {category_name} category',
-                                is_active=True
-                            )
-                            self.stdout.write(f"Created new category: {category_name}")
-                        
-                        # Parse stock information
-                        stock_quantity = self.parse_stock(row.get('stock', '0'))
-                        has_stock_info = row.get('has_stock_info', 'FALSE').upper() == 'TRUE'
-                        
-                        # Determine unit from item description
-                        unit = self.determine_unit(item_name)
-                        
-                        # Create or update product
-                        product, created = Product.objects.get_or_create(
-                            item_code=item_code,
-                            defaults={
-                                'name': item_name,
-                                'description': f'{item_name} - {category_name} category',
-                                'category': category,
-
-                                'unit': unit,
-                                'min_order_quantity': Decimal('1.0'),
-                                'in_stock': has_stock_info and stock_quantity > 0,
-                                'stock_quantity': stock_quantity if has_stock_info else Decimal('0.0'),
-                                'brand': self.extract_brand(item_name),
-                                'origin': 'India',  # Default origin
-                                'is_active': True
-                            }
-                        )
-                        
-                        if created:
-                            products_created += 1
-                        else:
-                            # Update existing product
-                            product.name = item_name
-                            product.description = f'{item_name} - {category_name} category'
-                            product.category = category
-                            product.unit = unit
-                            product.in_stock = has_stock_info and stock_quantity > 0
-                            product.stock_quantity = stock_quantity if has_stock_info else product.stock_quantity
-                            product.save()
-                            products_updated += 1
-                            
-                    except Exception as e:
-                        self.stdout.write(self.style.WARNING(f"Error processing row {row}: {str(e)}"))
-                        products_skipped += 1
-                        continue
-                
-                self.stdout.write(f"Products created: {products_created}")
-                self.stdout.write(f"Products updated: {products_updated}")
-                self.stdout.write(f"Products skipped: {products_skipped}")
-                
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f"Error importing products: {str(e)}"))
+    def worker_pool(self):
+        """
+        Process pool for cleaning and classifying rows, or a no-op context
+        with one worker.
 
-    def parse_stock(self, stock_str):
-        """Parse stock string to Decimal"""
-        try:
-            if stock_str and stock_str.strip():
-                return Decimal(stock_str)
-            return Decimal('0.0')
-        except:
-            return Decimal('0.0')
-
-    def determine_unit(self, item_name):
-        """Determine unit from item name"""
-        item_lower = item_name.lower()
-        
-        if any(word in item_lower for word in ['lb', 'pound']):
-            return 'lb'
-        elif any(word in item_lower for word in ['kg', 'kilo']):
-            return 'kg'
-        elif any(word in item_lower for word in ['g', 'gram']):
-            return 'g'
-        elif any(word in item_lower for word in ['ml', 'liter', 'l']):
-            return 'ml'
-        elif any(word in item_lower for word in ['oz', 'ounce']):
-            return 'oz'
-        elif any(word in item_lower for word in ['pack', 'pkg']):
-            return 'pack'
-        elif any(word in item_lower for word in ['piece', 'pc']):
-            return 'piece'
-        elif any(word in item_lower for word in ['box', 'case']):
-            return 'box'
+        The workers are forked before the import transaction opens, and the
+        idle database connections are closed first so no worker shares one.
+        """
+        if self.workers <= 1:
+            return nullcontext()
+        for conn in connections.all(initialized_only=True):
+            # A caller's open transaction can't be closed here; the workers
+            # never use the connection
+            if not conn.in_atomic_block:
+                conn.close()
+        return sources.worker_pool(get_classifier(), self.workers)
+
+    def iter_chunks(self):
+        """Yield the cleaned ``(item_code, row)`` pairs of every source chunk by chunk"""
+        chunks = sources.iter_normalized(
+            self.sources, get_classifier(), executor=self.executor, workers=self.workers
+        )
+        for rows, skipped, timings in chunks:
+            self.skipped_rows.extend(skipped)
+            for phase, seconds in timings.items():
+                self.timings[phase] += seconds
+            yield rows
+
+    def iter_products(self):
+        """Yield cleaned ``(item_code, row)`` pairs with the unit and brand filled in"""
+        for rows in self.iter_chunks():
+            yield from rows
+
+    def import_products(self):
+        """
+        Import products chunk by chunk as the sources are read.
+
+        Each chunk is diffed against the stored products and its new and
+        changed rows are upserted in batches. A repeated item code is
+        compared against what the earlier row wrote, so the last row wins.
+        A dry run records the same diff and skips every write.
+        """
+        started = time.perf_counter()
+        # Stored state of every existing product, in one query
+        existing = {
+            values[0]: (values[1], fingerprint(values[2:]))
+            for values in Product.objects.values_list('item_code', 'is_active', *FINGERPRINT_FIELDS)
+        }
+        self.timings['diff'] += time.perf_counter() - started
+
+        seen = set()
+        created = set()
+        written = set()
+        changed = self.changes['products_changed']
+        reactivate = []
+        rows_read = 0
+        duplicates = 0
+
+        for chunk in self.iter_chunks():
+            rows_read += len(chunk)
+            self.create_categories(sorted({row['category_name'] for item_code, row in chunk}))
+            started = time.perf_counter()
+
+            # Last row wins within the chunk
+            rows = dict(chunk)
+            duplicates += len(chunk) - len(rows) + len(seen.intersection(rows))
+            seen.update(rows)
+
+            products = {}
+            without_stock = set()
+            for item_code, row in rows.items():
+                item_name = row['name']
+                category_name = row['category_name']
+                is_active, stored = existing.get(item_code, (None, None))
+
+                if row['has_stock_info']:
+                    stock_quantity = row['stock_quantity']
+                    in_stock = stock_quantity > 0
+                elif stored:
+                    # Rows without stock info (every JSON row) keep the stock
+                    # already on record
+                    in_stock, stock_quantity = stored[-len(STOCK_FIELDS):]
+                else:
+                    in_stock, stock_quantity = False, Decimal('0.0')
+
+                product = Product(
+                    item_code=item_code,
+                    name=item_name,
+                    description=f'{item_name} - {category_name} category',
+                    category=self.categories[category_name],
+                    unit=row['unit'],
+                    min_order_quantity=Decimal('1.0'),
+                    in_stock=in_stock,
+                    stock_quantity=stock_quantity,
+                    brand=row['brand'],
+                    origin='India',  # Default origin
+                    is_active=True
+                )
+
+                if is_active is False and self.deactivate_missing:
+                    # The file is authoritative, so listed products come back
+                    reactivate.append(item_code)
+                    is_active = True
+
+                values = fingerprint([getattr(product, field) for field in FINGERPRINT_FIELDS])
+                existing[item_code] = (is_active is not False, values)
+                if stored is None:
+                    created.add(item_code)
+                elif stored == values:
+                    continue
+                elif item_code not in created:
+                    changed[item_code] = [
+                        field.removesuffix('_id')
+                        for field, old, new in zip(FINGERPRINT_FIELDS, stored, values) if old != new
+                    ]
+                products[item_code] = product
+                if not row['has_stock_info']:
+                    without_stock.add(item_code)
+            written.update(products)
+            self.timings['diff'] += time.perf_counter() - started
+
+            if self.dry_run:
+                continue
+
+            # INSERT ... ON CONFLICT (item_code) DO UPDATE in batches, for new
+            # and changed rows only so unchanged products keep their updated_at
+            started = time.perf_counter()
+            batches = [
+                ([product for item_code, product in products.items() if item_code not in without_stock],
+                 UPDATE_FIELDS),
+                ([product for item_code, product in products.items() if item_code in without_stock],
+                 NO_STOCK_UPDATE_FIELDS),
+            ]
+            for batch, update_fields in batches:
+                if batch:
+                    Product.objects.bulk_create(
+                        batch,
+                        batch_size=self.batch_size,
+                        update_conflicts=True,
+                        unique_fields=['item_code'],
+                        update_fields=update_fields
+                    )
+            self.timings['write'] += time.perf_counter() - started
+
+        missing = [
+            item_code for item_code, (is_active, stored) in existing.items()
+            if is_active and item_code not in seen
+        ]
+        deactivate = missing if self.deactivate_missing else []
+        if self.deactivate_missing:
+            active = sum(is_active for is_active, values in existing.values())
+            self.check_deactivation(len(seen), len(deactivate), active)
+
+        self.changes['products_new'].extend(sorted(created))
+        self.changes['products_reactivated'].extend(reactivate)
+        self.changes['products_deactivated'].extend(deactivate)
+        self.summary = {
+            'new': len(created),
+            'changed': len(written - created),
+            'unchanged': len(seen - written),
+            'reactivated': len(reactivate),
+            'deactivated': len(deactivate),
+            'missing': len(missing),
+            'skipped': len(self.skipped_rows),
+            'duplicates': duplicates,
+            'categories_new': len(self.changes['categories_new']),
+        }
+
+        if not self.dry_run:
+            started = time.perf_counter()
+            if reactivate:
+                Product.objects.filter(item_code__in=reactivate).update(
+                    is_active=True, updated_at=timezone.now(), catalog_version=None
+                )
+            if deactivate:
+                Product.objects.filter(item_code__in=deactivate).update(
+                    is_active=False, updated_at=timezone.now(), catalog_version=None
+                )
+            self.timings['write'] += time.perf_counter() - started
+            self.changed_item_codes.extend(written)
+            self.changed_item_codes.extend(reactivate)
+            self.changed_item_codes.extend(deactivate)
+
+        verb = 'to be ' if self.dry_run else ''
+        self.log.write(f"Products {verb}created: {len(created)}")
+        self.log.write(f"Products {verb}updated: {len(written - created)}")
+        self.log.write(f"Products unchanged: {len(seen - written)}")
+        if reactivate:
+            self.log.write(f"Products {verb}reactivated: {len(reactivate)}")
+        self.log.write(f"Products skipped: {len(self.skipped_rows)}")
+        if duplicates:
+            self.log.write(f"Duplicate item codes (last row kept): {duplicates}")
+        if self.deactivate_missing:
+            self.log.write(f"Products {verb}deactivated: {len(deactivate)}")
+
+        return rows_read + len(self.skipped_rows)
+
+    def check_deactivation(self, rows, deactivate, active):
+        """
+        Refuse to deactivate products on the strength of a suspicious source.
+
+        An empty, truncated or wrongly delimited file looks like a catalog
+        with most products missing. ``active`` counts the active products
+        before the deactivation. Raising rolls the whole import back.
+        """
+        if self.force:
+            return
+        if not rows:
+            problem = 'the sources yielded no products'
+        elif active and deactivate / active > self.max_deactivate:
+            problem = (
+                f'{deactivate} of {active} active products ({deactivate / active:.0%}) would be '
+                f'deactivated, more than --max-deactivate {self.max_deactivate:.0%}'
+            )
+        else:
+            return
+
+        message = f"Refusing to deactivate missing products: {problem}. Check the sources or pass --force."
+        if self.dry_run:
+            self.log.write(self.style.WARNING(message))
         else:
-            return 'unit'
-
-    def extract_brand(self, item_name):
-        """Extract brand name from item name if present"""
-        # Common brand indicators
-        brand_indicators = ['GM', 'QBV', 'LG', 'LIJJAT', 'HAPPY PANDA', 'MOTHER\'S PRIDE']
-        
-        for brand in brand_indicators:
-            if brand in item_name:
-                return brand
-        
-        return ''
+            raise CommandError(message)
+
+    def staging_rows(self):
+        """Cleaned source rows as tuples in importer.STAGING_COLUMNS order"""
+        for line, (item_code, row) in enumerate(self.iter_products()):
+            item_name = row['name']
+            has_stock_info = row['has_stock_info']
+            # Empty stock columns mean "keep the stored stock"
+            yield (
+                line,
+                item_code,
+                item_name,
+                f'{item_name} - {row["category_name"]} category',
+                row['category_name'],
+                row['unit'],
+                row['stock_quantity'] > 0 if has_stock_info else None,
+                row['stock_quantity'] if has_stock_info else None,
+                row['brand'],
+            )
+
+    def copy_import_products(self):
+        """Import products through a COPY staging table (PostgreSQL only)"""
+        now = timezone.now()
+        stats = importer.copy_import(
+            self.staging_rows(), now, deactivate=self.deactivate_missing
+        )
+        # The rows are parsed and classified while COPY consumes them; the
+        # diff happens inside the merge statements, so it counts as write
+        self.timings['write'] += stats['write_time']
+
+        if self.deactivate_missing:
+            active = Product.objects.filter(is_active=True).count() + stats['deactivated']
+            self.check_deactivation(stats['staged'], stats['deactivated'], active)
+
+        for name in stats['categories_created']:
+            self.log.write(f"Created category: {name}")
+        written = stats['created'] + stats['updated'] + stats['reactivated'] + stats['deactivated']
+        if written or stats['categories_created']:
+            self.catalog_touched = True
+        if written:
+            self.changed_since = now
+
+        self.log.write(f"Products created: {stats['created']}")
+        self.log.write(f"Products updated: {stats['updated']}")
+        self.log.write(f"Products unchanged: {stats['distinct'] - stats['created'] - stats['updated']}")
+        if stats['reactivated']:
+            self.log.write(f"Products reactivated: {stats['reactivated']}")
+        self.log.write(f"Products skipped: {len(self.skipped_rows)}")
+        duplicates = stats['staged'] - stats['distinct']
+        self.changes['categories_new'].extend(stats['categories_created'])
+        self.summary = {
+            'new': stats['created'],
+            'changed': stats['updated'],
+            'unchanged': stats['distinct'] - stats['created'] - stats['updated'],
+            'reactivated': stats['reactivated'],
+            'deactivated': stats['deactivated'],
+            'skipped': len(self.skipped_rows),
+            'duplicates': duplicates,
+            'categories_new': len(stats['categories_created']),
+        }
+        if duplicates:
+            self.log.write(f"Duplicate item codes (last row kept): {duplicates}")
+        if self.deactivate_missing:
+            self.log.write(f"Products deactivated: {stats['deactivated']}")
+
+        return stats['staged'] + len(self.skipped_rows)
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:16
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import Value
+
+import products.operations
+
+
+def populate_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    Category = apps.get_model('products', 'Category')
+    Product = apps.get_model('products', 'Product')
+
+    # Same definition as products.search.product_search_vector
+    for category_id, name, description in Category.objects.values_list('id', 'name', 'description'):
+        Product.objects.filter(category_id=category_id).update(
+            search_vector=(
+                SearchVector('name', weight='A', config='simple') +
+                SearchVector('item_code', weight='A', config='simple') +
+                SearchVector('brand', weight='B', config='simple') +
+                SearchVector(Value(name), weight='C', config='simple') +
+                SearchVector('description', weight='D', config='simple') +
+                SearchVector('origin', weight='D', config='simple') +
+                SearchVector(Value(description), weight='D', config='simple')
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_remove_product_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, help_text='Weighted name/item_code/brand/category vector, maintained by products.search', null=True),
+        ),
+        products.operations.AddPostgresIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='product_search_vector_gin'),
+        ),
+        migrations.RunPython(populate_search_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:08
+
+from django.db import migrations, models
+
+
+def publish_existing_rows(apps, schema_editor):
+    # Existing rows belong to the current version, so a full sync returns them
+    CatalogVersion = apps.get_model('products', 'CatalogVersion')
+    catalog, created = CatalogVersion.objects.get_or_create(pk=1)
+    for model_name in ('Category', 'Product'):
+        apps.get_model('products', model_name).objects.update(catalog_version=catalog.version)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_product_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='catalog_version',
+            field=models.PositiveBigIntegerField(editable=False, help_text='Catalog version that published the last write, see products.changes', null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='catalog_version',
+            field=models.PositiveBigIntegerField(editable=False, help_text='Catalog version that published the last write, see products.changes', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['catalog_version', 'id'], name='category_catalog_version_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['catalog_version', 'id'], name='product_catalog_version_idx'),
+        ),
+        migrations.RunPython(publish_existing_rows, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,25 @@
 from django.db import models
 from django.core.validators import MinValueValidator, DecimalValidator
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+
+def mark_unpublished(instance, update_fields=None):
+    """
+    Clear the catalog version of a row about to be written.
+
+    The next catalog version bump stamps it again (see products.cache), so
+    the changes feed sees writes in commit order. Returns ``update_fields``
+    with catalog_version added.
+    """
+    if update_fields is None:
+        instance.catalog_version = None
+        return None
+    if not update_fields:
+        # Nothing is written
+        return update_fields
+    instance.catalog_version = None
+    return {*update_fields, 'catalog_version'}
+
 
 class Category(models.Model):
     """Product category model"""
@@ -10,14 +30,27 @@ class Category(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    catalog_version = models.PositiveBigIntegerField(
+        null=True,
+        editable=False,
+        help_text="Catalog version that published the last write, see products.changes"
+    )
     
     class Meta:
         verbose_name = 'Category'
         verbose_name_plural = 'Categories'
         ordering = ['name']
+        indexes = [
+            # Changes feed order, see products.changes
+            models.Index(fields=['catalog_version', 'id'], name='category_catalog_version_idx'),
+        ]
     
     def __str__(self):
         return self.name
+    
+    def save(self, *args, **kwargs):
+        kwargs['update_fields'] = mark_unpublished(self, kwargs.get('update_fields'))
+        super().save(*args, **kwargs)
 
 class Product(models.Model):
     """Product model for Indian groceries and supplies"""
@@ -61,20 +94,57 @@ class Product(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    catalog_version = models.PositiveBigIntegerField(
+        null=True,
+        editable=False,
+        help_text="Catalog version that published the last write, see products.changes"
+    )
+    
+    # Search
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        help_text="Weighted name/item_code/brand/category vector, maintained by products.search"
+    )
     
     class Meta:
         verbose_name = 'Product'
         verbose_name_plural = 'Products'
         ordering = ['category', 'name']
+        # item_code is unique, so it already has an index. Listings only read
+        # active products, so the listing indexes are partial.
         indexes = [
-            models.Index(fields=['item_code']),
-            models.Index(fields=['category']),
-            models.Index(fields=['is_active']),
+            # Category filter ordered by name, keyset pagination (see
+            # products.pagination) and category foreign key lookups
+            models.Index(fields=['category', 'name', 'id'], name='product_category_name_id_idx'),
+            # Default listing order
+            models.Index(
+                fields=['name', 'id'],
+                name='product_active_name_idx',
+                condition=models.Q(is_active=True)
+            ),
+            # Featured products, newest first
+            models.Index(
+                fields=['-created_at'],
+                name='product_featured_idx',
+                condition=models.Q(is_active=True, in_stock=True)
+            ),
+            # Changes feed order, see products.changes
+            models.Index(fields=['catalog_version', 'id'], name='product_catalog_version_idx'),
+            # Changes feed lookups by timestamp
+            models.Index(fields=['updated_at', 'id'], name='product_updated_at_id_idx'),
+            GinIndex(fields=['search_vector'], name='product_search_vector_gin'),
+            GinIndex(fields=['name'], name='product_name_trgm', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['brand'], name='product_brand_trgm', opclasses=['gin_trgm_ops']),
         ]
     
     def __str__(self):
         return f"{self.item_code} - {self.name}"
     
+    def save(self, *args, **kwargs):
+        kwargs['update_fields'] = mark_unpublished(self, kwargs.get('update_fields'))
+        super().save(*args, **kwargs)
+    
     def is_available(self):
         """Check if product is available for ordering"""
         return self.is_active and self.in_stock and self.stock_quantity > 0
@@ -89,3 +159,22 @@ class Product(models.Model):
             return "Low Stock"
         else:
             return "In Stock"
+
+
+class CatalogVersion(models.Model):
+    """
+    Monotonically increasing catalog version.
+    
+    A single row, bumped after every Product or Category write. Read endpoints
+    derive their ETag and Last-Modified headers from it (see products.cache).
+    """
+    
+    version = models.PositiveBigIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Catalog Version'
+        verbose_name_plural = 'Catalog Version'
+    
+    def __str__(self):
+        return f"Catalog v{self.version}"
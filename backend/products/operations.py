@@ -0,0 +1,20 @@
+"""
+Migration operations for PostgreSQL-only schema features.
+
+The project runs on PostgreSQL but keeps SQLite usable for local work, so
+index types SQLite doesn't understand are only created on PostgreSQL. The
+migration state is the same on every backend.
+"""
+from django.db import migrations
+
+
+class AddPostgresIndex(migrations.AddIndex):
+    """AddIndex that is skipped on databases other than PostgreSQL"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
@@ -0,0 +1,133 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class ProductKeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination over the stable (category, name, id) ordering.
+
+    Each page is fetched with a range condition on the last row of the previous
+    page instead of an OFFSET, so deep pages cost the same as the first one.
+    Cursors are opaque; only forward navigation is supported. The response has
+    no count unless ``?count=true`` is passed.
+
+    The cursor only encodes that fixed ordering, so requests that ask for a
+    different one (``search`` relevance or ``ordering``) are rejected
+    instead of being silently reordered.
+    """
+
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor'
+    # Parameters that would change the ordering the cursor is built on
+    unsupported_query_params = ['search', 'ordering']
+    unsupported_message = 'Cursor pagination does not support search or ordering; use page numbers instead'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        for param in self.unsupported_query_params:
+            if request.query_params.get(param, '').strip():
+                raise ValidationError({param: [self.unsupported_message]})
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        self.count = None
+        if request.query_params.get(self.count_query_param, '').lower() == 'true':
+            # Count the whole filtered listing, not just what follows the cursor
+            self.count = queryset.order_by().count()
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            category_id, name, pk = position
+            # The redundant category_id__gte gives the planner an index range
+            # start on the composite (category, name, id) index
+            queryset = queryset.filter(category_id__gte=category_id).filter(
+                Q(category_id__gt=category_id) |
+                Q(category_id=category_id, name__gt=name) |
+                Q(category_id=category_id, name=name, id__gt=pk)
+            )
+
+        # Fetch one extra row to learn whether there is a next page
+        results = list(queryset.order_by('category_id', 'name', 'id')[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size < 1:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            category_id, name, pk = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            return int(category_id), str(name), int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, product):
+        position = [product.category_id, product.name, product.pk]
+        encoded = urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+        # Only the first page pays for the count
+        url = remove_query_param(self.base_url, self.count_query_param)
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_paginated_response(self, data):
+        response = {
+            'next': self.get_next_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            response['count'] = self.count
+        return Response(response)
+
+
+class ProductListPagination(PageNumberPagination):
+    """
+    Page-number pagination with an opt-in keyset mode for infinite scroll.
+
+    Requests with ``?pagination=cursor`` (or a ``cursor`` from a previous
+    keyset page) are handed to ProductKeysetPagination.
+    """
+
+    mode_query_param = 'pagination'
+
+    def __init__(self):
+        super().__init__()
+        self.keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get(self.mode_query_param) == 'cursor' or \
+                ProductKeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = ProductKeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
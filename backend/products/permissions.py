@@ -0,0 +1,26 @@
+import hmac
+
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+
+class IsStaffOrPartner(BasePermission):
+    """
+    Allows staff users, or integration partners that send one of the
+    PRODUCT_EXPORT_PARTNER_TOKENS in the X-Partner-Token header.
+    """
+
+    header = 'HTTP_X_PARTNER_TOKEN'
+
+    def has_permission(self, request, view):
+        user = request.user
+        if user and user.is_authenticated and user.is_staff:
+            return True
+
+        token = request.META.get(self.header, '')
+        if not token:
+            return False
+        return any(
+            hmac.compare_digest(token.encode(), partner_token.encode())
+            for partner_token in settings.PRODUCT_EXPORT_PARTNER_TOKENS
+        )
@@ -0,0 +1,261 @@
+"""
+Catalog search helpers.
+
+On PostgreSQL, product search runs against ``Product.search_vector``, a
+weighted tsvector over name, item_code, brand and category name (plus
+description, origin and category description at the lowest weight) that is
+backed by a GIN index. Terms match as word prefixes rather than substrings.
+Code-shaped queries such as ``10001`` skip text search and go straight to
+the item_code indexes. Fuzzy search uses pg_trgm word similarity on name
+and brand, backed by trigram GIN indexes. Other databases fall back to the
+multi-column ``icontains`` scan so local SQLite setups keep working.
+"""
+import re
+
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+)
+from django.db import connections
+from django.db.models import Count, F, Q, Subquery, Value
+from django.db.models.functions import Greatest
+
+from .models import Category, Product
+
+# The 'simple' configuration skips stemming and stop words, which would
+# otherwise mangle brand names and transliterated grocery names.
+SEARCH_CONFIG = 'simple'
+
+SEARCH_TERM_RE = re.compile(r'\w+')
+
+# Numeric codes as printed on the supplier sheets
+ITEM_CODE_RE = re.compile(r'^\d{3,}$')
+
+
+def is_postgresql(queryset):
+    """Check whether ``queryset`` will run against PostgreSQL"""
+    return connections[queryset.db].vendor == 'postgresql'
+
+
+# Product fields the search vector is built from
+SEARCH_VECTOR_FIELDS = {
+    'name', 'item_code', 'brand', 'description', 'origin', 'category', 'category_id'
+}
+
+
+def product_search_vector(category_name, category_description, product=None):
+    """
+    Build the weighted search vector expression for products in one category.
+
+    Covers every field the substring search matches. Reads the product's own
+    columns, which suits an UPDATE. With ``product`` the vector is built from
+    that instance's values instead, since an INSERT can't reference the row's
+    columns.
+    """
+    def source(field):
+        return field if product is None else Value(getattr(product, field) or '')
+
+    return (
+        SearchVector(source('name'), weight='A', config=SEARCH_CONFIG) +
+        SearchVector(source('item_code'), weight='A', config=SEARCH_CONFIG) +
+        SearchVector(source('brand'), weight='B', config=SEARCH_CONFIG) +
+        SearchVector(category_name, weight='C', config=SEARCH_CONFIG) +
+        # Free text matches too, but below any name, code or brand hit
+        SearchVector(source('description'), weight='D', config=SEARCH_CONFIG) +
+        SearchVector(source('origin'), weight='D', config=SEARCH_CONFIG) +
+        SearchVector(category_description, weight='D', config=SEARCH_CONFIG)
+    )
+
+
+def instance_search_vector(product):
+    """Search vector expression for saving ``product``, category included"""
+    category = Category.objects.filter(pk=product.category_id)
+    return product_search_vector(
+        Subquery(category.values('name')[:1]), Subquery(category.values('description')[:1]), product
+    )
+
+
+def update_search_vectors(products=None):
+    """
+    Recompute ``search_vector`` for ``products`` (all products by default).
+
+    Runs one UPDATE per affected category, since the category name is part of
+    the vector and joined columns can't be referenced in an UPDATE. Returns the
+    number of rows updated; a no-op outside PostgreSQL.
+    """
+    if products is None:
+        products = Product.objects.all()
+    if not is_postgresql(products):
+        return 0
+
+    categories = Category.objects.filter(
+        pk__in=products.values('category_id')
+    ).values_list('id', 'name', 'description')
+
+    updated = 0
+    for category_id, category_name, category_description in categories:
+        updated += products.filter(category_id=category_id).update(
+            search_vector=product_search_vector(Value(category_name), Value(category_description))
+        )
+    return updated
+
+
+def search_terms(search):
+    """Split a raw search string into normalized terms"""
+    return SEARCH_TERM_RE.findall(search.lower())
+
+
+def is_item_code(search):
+    """Check whether ``search`` looks like a supplier item code"""
+    return bool(ITEM_CODE_RE.match(search.strip()))
+
+
+def search_item_code(queryset, search):
+    """
+    Filter ``queryset`` to products whose item_code starts with ``search``.
+
+    One range scan on the varchar_pattern_ops index Django adds for unique
+    CharFields. Ordering by code puts an exact match first, since it sorts
+    before every longer code it prefixes.
+    """
+    return queryset.filter(item_code__startswith=search.strip()).order_by('item_code')
+
+
+def search_products(queryset, search, item_codes=True):
+    """
+    Filter ``queryset`` to products matching every term in ``search``.
+
+    Terms are ANDed together and each one matches as a prefix, so partially
+    typed words still find results. Matches are ordered most relevant first.
+    On PostgreSQL a term must start a word: ``masala`` finds
+    ``GARAM MASALA`` but ``asala`` no longer matches it as the substring
+    search did; use ``?mode=fuzzy`` for misspelled or partial words.
+    Code-shaped searches match item codes instead, unless ``item_codes`` is
+    off; callers fall back to text search when no code matches.
+    """
+    if not search or not search.strip():
+        return queryset
+
+    if item_codes and is_item_code(search):
+        return search_item_code(queryset, search)
+
+    terms = search_terms(search)
+    if not terms:
+        return queryset.none()
+
+    if not is_postgresql(queryset):
+        return legacy_search_products(queryset, terms)
+
+    query = SearchQuery(
+        ' & '.join(f'{term}:*' for term in terms),
+        config=SEARCH_CONFIG,
+        search_type='raw',
+    )
+    return queryset.filter(search_vector=query).annotate(
+        search_rank=SearchRank(F('search_vector'), query)
+    ).order_by('-search_rank', 'name')
+
+
+def set_fuzzy_threshold(threshold, using='default'):
+    """
+    Set the pg_trgm word similarity threshold for the current transaction.
+
+    The ``%>`` operator compares against this setting, which is what lets the
+    trigram indexes serve any threshold. Must be called inside an atomic block.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)",
+            [str(threshold)]
+        )
+
+
+def fuzzy_search_products(queryset, search, item_codes=True):
+    """
+    Filter ``queryset`` to products whose name or brand resembles ``search``.
+
+    Catches misspellings and transliterations ("daal", "dhal", "basmathi").
+    Matches are ordered by similarity. Callers should run the query after
+    ``set_fuzzy_threshold`` in the same transaction; otherwise pg_trgm's
+    default threshold applies. Code-shaped searches match item codes as in
+    ``search_products``. Falls back to ``search_products`` outside PostgreSQL.
+    """
+    if not search or not search.strip():
+        return queryset
+
+    if not is_postgresql(queryset):
+        return search_products(queryset, search, item_codes)
+
+    if item_codes and is_item_code(search):
+        return search_item_code(queryset, search)
+
+    search = ' '.join(search_terms(search))
+    if not search:
+        return queryset.none()
+
+    return queryset.filter(
+        Q(name__trigram_word_similar=search) | Q(brand__trigram_word_similar=search)
+    ).annotate(
+        similarity=Greatest(
+            TrigramWordSimilarity(search, 'name'),
+            TrigramWordSimilarity(search, 'brand'),
+        )
+    ).order_by('-similarity', 'name')
+
+
+def legacy_search_products(queryset, terms):
+    """Substring search used where full-text search isn't available"""
+    search_filters = Q()
+
+    for term in terms:
+        # AND logic between terms, OR across the searchable columns
+        search_filters &= (
+            Q(name__icontains=term) |
+            Q(description__icontains=term) |
+            Q(item_code__icontains=term) |
+            Q(brand__icontains=term) |
+            Q(origin__icontains=term) |
+            Q(category__name__icontains=term) |
+            Q(category__description__icontains=term)
+        )
+
+    return queryset.filter(search_filters).order_by('name')
+
+
+def product_facets(queryset):
+    """
+    Count ``queryset`` by category, brand, origin and in_stock.
+
+    Runs a single GROUP BY over all four dimensions and rolls the rows up into
+    one list per facet, most common values first.
+    """
+    rows = queryset.order_by().values(
+        'category_id', 'category__name', 'brand', 'origin', 'in_stock'
+    ).annotate(count=Count('id'))
+
+    categories = {}
+    brands = {}
+    origins = {}
+    stock = {}
+
+    for row in rows:
+        count = row['count']
+        category_key = (row['category_id'], row['category__name'])
+        categories[category_key] = categories.get(category_key, 0) + count
+        if row['brand']:
+            brands[row['brand']] = brands.get(row['brand'], 0) + count
+        if row['origin']:
+            origins[row['origin']] = origins.get(row['origin'], 0) + count
+        stock[row['in_stock']] = stock.get(row['in_stock'], 0) + count
+
+    def ranked(counts):
+        return sorted(counts.items(), key=lambda item: (-item[1], str(item[0])))
+
+    return {
+        'category': [
+            {'id': category_id, 'name': name, 'count': count}
+            for (category_id, name), count in ranked(categories)
+        ],
+        'brand': [{'value': value, 'count': count} for value, count in ranked(brands)],
+        'origin': [{'value': value, 'count': count} for value, count in ranked(origins)],
+        'in_stock': [{'value': value, 'count': count} for value, count in ranked(stock)],
+    }
@@ -1,3 +1,7 @@
+from decimal import Decimal
+from django.conf import settings
+from django.utils import timezone
+from django.utils.functional import cached_property
 from rest_framework import serializers
 from .models import Category, Product
 
@@ -14,7 +18,94 @@ class CategorySerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 
-class ProductListSerializer(serializers.ModelSerializer):
+class CategoryCompactSerializer(serializers.ModelSerializer):
+    """Category reduced to what the product grid needs"""
+    
+    class Meta:
+        model = Category
+        fields = ['id', 'name']
+        read_only_fields = ['id', 'name']
+
+
+def get_sparse_options(serializer):
+    """
+    Read the sparse fieldset parameters for a top-level product serializer.
+    
+    Returns ``(requested, compact, expand)``, or None when the serializer has
+    no request or is nested inside another serializer.
+    """
+    parent = serializer.parent
+    if isinstance(parent, serializers.ListSerializer):
+        # With many=True the list is the top-level serializer
+        parent = parent.parent
+    
+    request = serializer.context.get('request')
+    if request is None or parent is not None:
+        return None
+    return parse_sparse_params(request.query_params)
+
+
+def parse_sparse_params(params):
+    """Split the sparse fieldset query parameters into ``(requested, compact, expand)``"""
+    requested = [name.strip() for name in params.get('fields', '').split(',') if name.strip()]
+    compact = params.get('compact', '').lower() == 'true'
+    expand = [name.strip() for name in params.get('expand', '').split(',')]
+    return requested, compact, expand
+
+
+def sparse_params_key(params, serializer_class):
+    """
+    Canonical form of the sparse fieldset parameters for ``serializer_class``.
+    
+    Requests with the same key get the same representation: unknown field
+    names, their order and repeats are dropped and the flags are booleans,
+    so the key stays short and safe for any cache backend.
+    """
+    requested, compact, expand = parse_sparse_params(params)
+    fields = '*'
+    if requested:
+        fields = ','.join(sorted(set(requested).intersection(serializer_class.Meta.fields)))
+    return f'{fields}:{int(compact)}:{int("category" in expand)}'
+
+
+class SparseFieldsMixin:
+    """
+    Lets API clients trim product representations with query parameters.
+    
+    ?fields=id,name,...   only return the listed fields
+    ?compact=true         category as {id, name}, no description
+    ?expand=category      full nested category, even in compact mode
+    
+    Only applies to top-level serializers, so products nested in carts and
+    orders keep their full shape.
+    """
+    
+    compact_exclude = ['description']
+    
+    def get_fields(self):
+        fields = super().get_fields()
+        
+        options = get_sparse_options(self)
+        if options is None:
+            return fields
+        requested, compact, expand = options
+        
+        if compact:
+            if not requested:
+                for name in self.compact_exclude:
+                    fields.pop(name, None)
+            if 'category' in fields and 'category' not in expand:
+                fields['category'] = CategoryCompactSerializer(read_only=True)
+        
+        if requested:
+            for name in list(fields):
+                if name not in requested:
+                    fields.pop(name)
+        
+        return fields
+
+
+class ProductListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for product listing (minimal data)"""
     
     category = CategorySerializer(read_only=True)
@@ -29,7 +120,134 @@ class ProductListSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 
-class ProductDetailSerializer(serializers.ModelSerializer):
+# Fast read path
+#
+# Plain functions that build the same output as the ModelSerializers above
+# without instantiating Field objects. Used by the *FastSerializer classes when
+# settings.FAST_READ_SERIALIZERS is on; `manage.py benchmark_serializers`
+# checks that both paths agree.
+
+TWO_PLACES = Decimal('0.01')
+
+
+def format_decimal(value):
+    """Render a 2-place DecimalField the way DRF does"""
+    if value is None:
+        return ''
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value).strip())
+    return f'{value.quantize(TWO_PLACES):f}'
+
+
+def format_datetime(value):
+    """Render a DateTimeField the way DRF does (ISO 8601, 'Z' for UTC)"""
+    if not value:
+        return None
+    current_timezone = timezone.get_current_timezone()
+    if timezone.is_aware(value):
+        value = value.astimezone(current_timezone)
+    else:
+        value = timezone.make_aware(value, current_timezone)
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def category_representation(category, compact=False):
+    """Same output as CategorySerializer (or CategoryCompactSerializer)"""
+    if compact:
+        return {'id': category.id, 'name': category.name}
+    return {
+        'id': category.id,
+        'name': category.name,
+        'description': category.description,
+        'slug': category.slug,
+        'is_active': category.is_active,
+        'created_at': format_datetime(category.created_at),
+        'updated_at': format_datetime(category.updated_at),
+    }
+
+
+def product_list_representation(product, compact_category=False, categories=None):
+    """
+    Same output as ProductListSerializer.
+    
+    ``categories`` is an optional dict, kept for the length of one list, that
+    memoizes category representations by id since most rows share a handful.
+    """
+    if categories is None:
+        category = category_representation(product.category, compact_category)
+    else:
+        category = categories.get(product.category_id)
+        if category is None:
+            category = categories[product.category_id] = category_representation(
+                product.category, compact_category
+            )
+    
+    return {
+        'id': product.id,
+        'item_code': product.item_code,
+        'name': product.name,
+        'description': product.description,
+        'category': category,
+        'unit': product.unit,
+        'min_order_quantity': format_decimal(product.min_order_quantity),
+        'in_stock': product.in_stock,
+        'stock_quantity': format_decimal(product.stock_quantity),
+        'brand': product.brand,
+        'origin': product.origin,
+        'is_active': product.is_active,
+    }
+
+
+class FastRepresentationMixin:
+    """
+    Per-list state for the fast read serializers.
+    
+    With many=True one child serializer renders every row, so whatever is
+    cached on it is computed once per list rather than once per row.
+    """
+    
+    @cached_property
+    def categories(self):
+        """Category representations by id, for product_list_representation()"""
+        return {}
+
+
+class ProductListFastSerializer(FastRepresentationMixin, serializers.BaseSerializer):
+    """Read-only fast path for ProductListSerializer, sparse fieldsets included"""
+    
+    @cached_property
+    def sparse_options(self):
+        return get_sparse_options(self)
+    
+    def to_representation(self, product):
+        if self.sparse_options is None:
+            return product_list_representation(product, categories=self.categories)
+        requested, compact, expand = self.sparse_options
+        
+        data = product_list_representation(
+            product,
+            compact_category=compact and 'category' not in expand,
+            categories=self.categories
+        )
+        if requested:
+            return {name: value for name, value in data.items() if name in requested}
+        if compact:
+            for name in SparseFieldsMixin.compact_exclude:
+                data.pop(name, None)
+        return data
+
+
+def product_list_serializer_class():
+    """ProductListSerializer, or its fast path when FAST_READ_SERIALIZERS is on"""
+    if settings.FAST_READ_SERIALIZERS:
+        return ProductListFastSerializer
+    return ProductListSerializer
+
+
+class ProductDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for detailed product view"""
     
     category = CategorySerializer(read_only=True)
@@ -48,10 +266,49 @@ class ProductDetailSerializer(serializers.ModelSerializer):
 class ProductSearchSerializer(serializers.Serializer):
     """Serializer for product search parameters"""
     
+    SEARCH_MODE_CHOICES = [
+        ('fulltext', 'Full-text'),
+        ('fuzzy', 'Fuzzy (trigram similarity)'),
+    ]
+    
     search = serializers.CharField(required=False, allow_blank=True)
+    mode = serializers.ChoiceField(choices=SEARCH_MODE_CHOICES, required=False, default='fulltext')
+    threshold = serializers.FloatField(required=False, min_value=0.0, max_value=1.0)
     category = serializers.IntegerField(required=False)
     in_stock = serializers.BooleanField(required=False)
     brand = serializers.CharField(required=False, allow_blank=True)
     origin = serializers.CharField(required=False, allow_blank=True)
     page = serializers.IntegerField(required=False, min_value=1, default=1)
     page_size = serializers.IntegerField(required=False, min_value=1, max_value=100, default=20)
+
+
+class ProductSuggestSerializer(serializers.Serializer):
+    """Serializer for typeahead suggestion parameters"""
+    
+    q = serializers.CharField(max_length=100, trim_whitespace=True)
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=25, default=10)
+
+
+class ProductBulkLookupSerializer(serializers.Serializer):
+    """Serializer for bulk product lookup by ids and/or item codes"""
+    
+    MAX_ITEMS = 500
+    
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        max_length=MAX_ITEMS
+    )
+    item_codes = serializers.ListField(
+        child=serializers.CharField(max_length=50),
+        required=False,
+        max_length=MAX_ITEMS
+    )
+    
+    def validate(self, data):
+        total = len(data.get('ids', [])) + len(data.get('item_codes', []))
+        if total == 0:
+            raise serializers.ValidationError("Provide at least one id or item_code")
+        if total > self.MAX_ITEMS:
+            raise serializers.ValidationError(f"At most {self.MAX_ITEMS} products can be looked up at once")
+        return data
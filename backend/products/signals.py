@@ -0,0 +1,53 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import cache
+from .models import Category, Product
+from .search import (
+    SEARCH_VECTOR_FIELDS, instance_search_vector, is_postgresql,
+    update_search_vectors
+)
+
+
+@receiver(pre_save, sender=Product)
+def set_product_search_vector(sender, instance, raw=False, using=None, update_fields=None, **kwargs):
+    """Write the product's search vector in the same INSERT or UPDATE as the product"""
+    if raw or not is_postgresql(Product.objects.using(using)):
+        return
+    if update_fields is not None and not SEARCH_VECTOR_FIELDS.intersection(update_fields):
+        return
+    # Left as an expression on the instance; it is recomputed on every save
+    instance.search_vector = instance_search_vector(instance)
+
+
+@receiver(post_save, sender=Product)
+def refresh_product_search_vector(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Catch up on saves whose update_fields left the search vector out.
+
+    A save that lists searchable fields but not ``search_vector`` can't
+    write the vector computed in set_product_search_vector.
+    """
+    if raw or update_fields is None or 'search_vector' in update_fields:
+        return
+    if SEARCH_VECTOR_FIELDS.intersection(update_fields):
+        update_search_vectors(Product.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Category)
+def refresh_category_search_vectors(sender, instance, raw=False, **kwargs):
+    """Category names are part of the product vector, so reindex the category"""
+    if raw:
+        return
+    update_search_vectors(instance.products.all())
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def catalog_changed(sender, raw=False, using=None, **kwargs):
+    """Bump the catalog version and invalidate caches once the write commits"""
+    if raw:
+        return
+    cache.schedule_catalog_changed(using)
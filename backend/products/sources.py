@@ -0,0 +1,288 @@
+"""
+Streaming catalog sources for ``import_catalog``.
+
+A source is the catalog CSV export or a JSON export with an ``items`` list
+(the layout of catalog.json). Both are read incrementally and cut into
+chunks of raw records; normalize_chunk() cleans and classifies a chunk.
+iter_normalized() runs it in a process pool when more than one worker is
+configured and hands the chunks back in source order, so a later row still
+wins over an earlier one with the same item code. Only a few chunks are in
+memory at any time, whatever the size of the sources.
+"""
+import csv
+import json
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from itertools import islice
+
+CHUNK_SIZE = 2000
+
+TWO_PLACES = Decimal('0.01')
+
+# Raw record layout, named after the CSV columns
+RAW_FIELDS = ['item_number', 'item_description', 'product_category', 'stock', 'has_stock_info']
+
+# catalog.json item keys for each raw field; JSON items carry no stock
+JSON_ITEM_FIELDS = {
+    'item_number': 'item_code',
+    'item_description': 'item_name',
+    'product_category': 'category',
+}
+
+WHITESPACE_RE = re.compile(r'[ \t\n\r]*')
+
+
+class JSONStreamReader:
+    """
+    Pull parser for one JSON document, read from a file in chunks.
+
+    Objects and arrays can be walked member by member with iter_keys() and
+    iter_array(), so a large array is never decoded as a whole; any other
+    value is decoded with value().
+    """
+
+    def __init__(self, file, chunk_size=64 * 1024):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self):
+        """Read the next chunk, dropping what has been parsed; False at end of file"""
+        if self.eof:
+            return False
+        data = self.file.read(self.chunk_size)
+        if not data:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it"""
+        while True:
+            self.pos = WHITESPACE_RE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                raise ValueError('Unexpected end of JSON document')
+
+    def expect(self, chars):
+        """Consume the next character, which must be one of ``chars``"""
+        char = self.peek()
+        if char not in chars:
+            raise ValueError(f"Expected {' or '.join(repr(c) for c in chars)} at offset {self.pos}, got {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decode the next complete value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # The value runs past the buffer
+                if not self.fill():
+                    raise
+                continue
+            # A number or literal at the very end may still be incomplete
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+    def skip(self):
+        """Consume the next value, walking arrays instead of decoding them"""
+        if self.peek() == '[':
+            for _ in self.iter_array():
+                pass
+        else:
+            self.value()
+
+    def iter_keys(self):
+        """Yield the keys of the next object; the caller must consume each member value"""
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
+
+    def iter_array(self):
+        """Yield the decoded elements of the next array"""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(',]') == ']':
+                return
+
+
+def read_json_member(path, name, default=None):
+    """Decode one top-level member of a JSON file, skipping the others unparsed"""
+    with open(path, 'r', encoding='utf-8') as file:
+        reader = JSONStreamReader(file)
+        for key in reader.iter_keys():
+            if key == name:
+                return reader.value()
+            reader.skip()
+    return default
+
+
+def iter_json_items(path, name='items'):
+    """Yield the elements of a top-level array member of a JSON file, one at a time"""
+    with open(path, 'r', encoding='utf-8') as file:
+        reader = JSONStreamReader(file)
+        for key in reader.iter_keys():
+            if key == name:
+                yield from reader.iter_array()
+            else:
+                reader.skip()
+
+
+def iter_records(path):
+    """Yield raw records (tuples in RAW_FIELDS order) from a CSV or JSON source"""
+    if path.lower().endswith('.json'):
+        for item in iter_json_items(path):
+            yield tuple(str(item.get(JSON_ITEM_FIELDS.get(field), '') or '') for field in RAW_FIELDS)
+        return
+
+    with open(path, 'r', encoding='utf-8', newline='') as file:
+        for row in csv.DictReader(file):
+            yield tuple(row.get(field) or '' for field in RAW_FIELDS)
+
+
+def iter_chunks(sources, chunk_size=CHUNK_SIZE):
+    """Yield lists of up to ``chunk_size`` raw records, source by source"""
+    for path in sources:
+        records = iter_records(path)
+        while True:
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                break
+            yield chunk
+
+
+def parse_stock(stock_str):
+    """Parse a stock value to Decimal rounded half-up to two places, 0 if unusable"""
+    try:
+        if stock_str and stock_str.strip():
+            return Decimal(stock_str).quantize(TWO_PLACES, rounding=ROUND_HALF_UP)
+    except (InvalidOperation, ValueError):
+        pass
+    return Decimal('0.00')
+
+
+def normalize_chunk(records, classifier=None):
+    """
+    Clean and classify a chunk of raw records.
+
+    Returns ``(rows, skipped, timings)``: ``rows`` is a list of
+    ``(item_code, row)`` pairs in record order, ``skipped`` lists the records
+    without an item code, name or category with the reason, and ``timings``
+    holds the seconds spent in the parse and classify phases.
+    """
+    classifier = classifier or _worker_classifier
+    started = time.perf_counter()
+
+    cleaned = []
+    skipped = []
+    for item_number, item_description, product_category, stock, has_stock_info in records:
+        item_code = item_number.strip()
+        item_name = item_description.strip()
+        category_name = product_category.strip()
+        missing = [
+            field for field, value in
+            [('item code', item_code), ('name', item_name), ('category', category_name)] if not value
+        ]
+        if missing:
+            skipped.append({
+                'item_code': item_code, 'name': item_name, 'reason': f'missing {" and ".join(missing)}'
+            })
+            continue
+        cleaned.append((item_code, {
+            'name': item_name,
+            'category_name': category_name,
+            'has_stock_info': has_stock_info.strip().upper() == 'TRUE',
+            'stock_quantity': parse_stock(stock),
+        }))
+    parsed = time.perf_counter()
+
+    labels = classifier.classify_many([row['name'] for item_code, row in cleaned])
+    for (item_code, row), (unit, brand) in zip(cleaned, labels):
+        row['unit'] = unit
+        row['brand'] = brand
+    return cleaned, skipped, {'parse': parsed - started, 'classify': time.perf_counter() - parsed}
+
+
+_worker_classifier = None
+
+
+def init_worker(classifier):
+    global _worker_classifier
+    _worker_classifier = classifier
+
+
+def worker_pool(classifier, workers):
+    """
+    Start a process pool for iter_normalized().
+
+    Every worker is started before this returns, so create the pool before
+    opening a transaction: forked workers inherit the parent's open sockets,
+    database connections included.
+    """
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(classifier,))
+    executor.submit(int).result()
+    return executor
+
+
+def iter_normalized(sources, classifier, executor=None, workers=1, chunk_size=CHUNK_SIZE):
+    """
+    Yield normalize_chunk() results for every chunk of ``sources``, in order.
+
+    Reading the sources counts towards each chunk's parse time. Given an
+    ``executor`` from worker_pool(), the chunks are normalized in its
+    ``workers`` processes, at most two chunks per worker in flight, and the
+    phase timings are summed across workers rather than wall-clock.
+    """
+    chunks = iter_chunks(sources, chunk_size)
+
+    def read_chunks():
+        while True:
+            started = time.perf_counter()
+            chunk = next(chunks, None)
+            if chunk is None:
+                return
+            yield chunk, time.perf_counter() - started
+
+    def result(rows, skipped, timings, read_time):
+        timings['parse'] += read_time
+        return rows, skipped, timings
+
+    if executor is None:
+        for chunk, read_time in read_chunks():
+            yield result(*normalize_chunk(chunk, classifier), read_time)
+        return
+
+    pending = deque()
+    for chunk, read_time in read_chunks():
+        pending.append((executor.submit(normalize_chunk, chunk), read_time))
+        if len(pending) >= workers * 2:
+            future, read_time = pending.popleft()
+            yield result(*future.result(), read_time)
+    while pending:
+        future, read_time = pending.popleft()
+        yield result(*future.result(), read_time)
@@ -0,0 +1,156 @@
+"""
+In-process prefix index for search-as-you-type suggestions.
+
+The index holds every word-start of active product names, plus brands and
+item codes, as sorted normalized keys. A lookup is a binary search for the
+range of keys with the prefix, ranked with a bounded heap, so keystrokes
+never reach the database. Each process rebuilds its index in a background
+thread when the catalog version changes and keeps serving the previous one
+until the new index is ready.
+"""
+import heapq
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connection
+
+from .cache import get_catalog_version
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+NORMALIZE_RE = re.compile(r'[^0-9a-z]+')
+
+# Sorts after every character a normalized key can contain
+KEY_RANGE_END = '{'
+
+# Lower ranks sort first: brands, then names, then item codes
+KIND_RANK = {'brand': 0, 'name': 1, 'item_code': 2}
+
+
+def normalize(text):
+    """Lowercase and collapse punctuation so 'Mother's' matches 'mothers'"""
+    return NORMALIZE_RE.sub(' ', text.lower().replace("'", '')).strip()
+
+
+def entry(key, kind, position, label, product_id):
+    """
+    Index entry: ``(key, rank, kind, label, product id)``.
+
+    Mid-name word matches rank last, then by kind; shorter labels first.
+    """
+    rank = (position > 0, KIND_RANK[kind], len(label), label)
+    return (key, rank, kind, label, product_id)
+
+
+class PrefixIndex:
+    """Sorted-key prefix index over product names, brands and item codes"""
+
+    def __init__(self, entries, version=None):
+        entries.sort(key=lambda entry: entry[0])
+        self.keys = [entry[0] for entry in entries]
+        self.entries = entries
+        self.version = version
+
+    @classmethod
+    def build(cls, version=None):
+        """Build an index from the active products"""
+        entries = []
+        brands = set()
+        rows = Product.objects.filter(is_active=True).values_list(
+            'id', 'item_code', 'name', 'brand'
+        )
+
+        for product_id, item_code, name, brand in rows.iterator(chunk_size=2000):
+            words = normalize(name).split()
+            for position in range(len(words)):
+                entries.append(entry(' '.join(words[position:]), 'name', position, name, product_id))
+            # Codes like 'AB-12' match 'ab-1' (normalized the same way) and 'ab1'
+            code = normalize(item_code)
+            for key in {code, code.replace(' ', '')}:
+                entries.append(entry(key, 'item_code', 0, item_code, product_id))
+            if brand:
+                brands.add(brand)
+
+        for brand in brands:
+            entries.append(entry(normalize(brand), 'brand', 0, brand, None))
+
+        return cls(entries, version=version)
+
+    def lookup(self, prefix, limit=10):
+        """Return up to ``limit`` completions for ``prefix``, best first"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + KEY_RANGE_END, start)
+
+        # Best rank per suggestion across the whole range; a one-letter
+        # prefix still ranks every match instead of the first few keys
+        best = {}
+        for position in range(start, end):
+            key, rank, kind, label, product_id = self.entries[position]
+            current = best.get((kind, label))
+            if current is None or rank < current[0]:
+                best[(kind, label)] = (rank, product_id)
+
+        ranked = heapq.nsmallest(limit, best.items(), key=lambda item: item[1][0])
+        return [
+            {'type': kind, 'value': label, 'product_id': product_id}
+            for (kind, label), (rank, product_id) in ranked
+        ]
+
+
+_index = None
+_checked_at = 0.0
+_rebuild = None
+_lock = threading.Lock()
+
+
+def rebuild_index(version):
+    """Build the index for ``version`` and swap it in; runs in its own thread"""
+    global _index
+    try:
+        index = PrefixIndex.build(version=version)
+        with _lock:
+            _index = index
+    except Exception:
+        logger.exception('Rebuilding the suggest index for catalog version %s failed', version)
+    finally:
+        # The thread's own database connection
+        connection.close()
+
+
+def get_suggest_index():
+    """
+    Return this process's prefix index, rebuilding it if the catalog changed.
+
+    The catalog version is re-read at most every
+    PRODUCT_SUGGEST_VERSION_CHECK_INTERVAL seconds. Only the first call
+    builds an index on the request path; later rebuilds run in a background
+    thread while the current index keeps serving.
+    """
+    global _index, _checked_at, _rebuild
+
+    now = time.monotonic()
+    if _index is not None and now - _checked_at < settings.PRODUCT_SUGGEST_VERSION_CHECK_INTERVAL:
+        return _index
+
+    with _lock:
+        if _index is not None and now - _checked_at < settings.PRODUCT_SUGGEST_VERSION_CHECK_INTERVAL:
+            # Another request checked while this one waited
+            return _index
+
+        version, updated_at = get_catalog_version()
+        _checked_at = now
+        if _index is None:
+            _index = PrefixIndex.build(version=version)
+        elif _index.version != version and (_rebuild is None or not _rebuild.is_alive()):
+            _rebuild = threading.Thread(target=rebuild_index, args=(version,), daemon=True)
+            _rebuild.start()
+        return _index
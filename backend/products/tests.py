@@ -1,3 +1,1304 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import re
+import tempfile
+from base64 import urlsafe_b64encode
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+
+from django.db import connection
+from django.core.cache import cache as default_cache
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from .classifier import CatalogClassifier, get_classifier
+from cart.models import Cart, CartItem
+from cart.serializers import CartItemSerializer
+from .cache import (
+    PRODUCT_STATS_CACHE_KEY, SearchResultCache, bump_catalog_version, compute_product_stats,
+    get_catalog_version, search_result_cache,
+)
+from .models import CatalogVersion, Category, Product
+from .search import search_products, set_fuzzy_threshold, update_search_vectors
+from .serializers import ProductListSerializer
+from . import suggest
+from .sources import JSONStreamReader, normalize_chunk
+from .suggest import PrefixIndex, get_suggest_index
+from .views import ProductListView
+
+
+class CatalogQueryPlanTests(TestCase):
+    """The main catalog queries are planned on their indexes, not table scans"""
+
+    product_count = 20000
+    category_count = 25
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = Category.objects.bulk_create([
+            Category(name=f'Category {index}', slug=f'category-{index}')
+            for index in range(cls.category_count)
+        ])
+        Product.objects.bulk_create([
+            Product(
+                item_code=str(100000 + index),
+                name=f'PRODUCT X{index % 997:03d} {index}',
+                category=categories[index % cls.category_count],
+                unit='each',
+                in_stock=index % 4 != 0,
+                is_active=index % 10 != 0,
+            )
+            for index in range(cls.product_count)
+        ], batch_size=2000)
+        update_search_vectors()
+        cls.category = categories[3]
+
+        # Fresh statistics, so the plans below come from the real cost model.
+        # Autovacuum would have merged the GIN pending list on a live catalog;
+        # left in place, scanning it makes every full-text plan look costly.
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute("SELECT gin_clean_pending_list('product_search_vector_gin')")
+            cursor.execute('ANALYZE')
+
+    def list_view_queryset(self, params):
+        view = ProductListView()
+        view.request = Request(APIRequestFactory().get('/api/products/', params))
+        view.format_kwarg = None
+        return view.filter_queryset(view.get_queryset())
+
+    def assertUsesIndex(self, queryset, index):
+        """Assert the plan reads products_product through an index named ``index*``"""
+        plan = queryset.explain()
+        if connection.vendor == 'postgresql':
+            self.assertNotIn('Seq Scan on products_product', plan)
+            self.assertRegex(plan, rf'(Index Scan|Index Only Scan|Bitmap Index Scan) (using|on) {index}')
+        else:
+            product_scans = [
+                line.strip() for line in plan.splitlines()
+                if re.search(r'(SCAN|SEARCH) products_product\b', line)
+            ]
+            self.assertEqual(len(product_scans), 1, plan)
+            self.assertRegex(product_scans[0], rf'USING (COVERING )?INDEX {index}')
+
+    def test_default_listing(self):
+        self.assertUsesIndex(self.list_view_queryset({})[:20], 'product_active_name_idx')
+
+    def test_category_listing(self):
+        queryset = self.list_view_queryset({'category': self.category.id})
+        self.assertUsesIndex(queryset[:20], 'product_category_name_id_idx')
+
+    def test_in_stock_category_listing(self):
+        queryset = self.list_view_queryset({'category': self.category.id, 'in_stock': 'true'})
+        self.assertUsesIndex(queryset[:20], 'product_category_name_id_idx')
+
+    def test_keyset_listing(self):
+        queryset = Product.objects.filter(is_active=True, category_id__gte=self.category.id)
+        self.assertUsesIndex(queryset.order_by('category_id', 'name', 'id')[:21], 'product_category_name_id_idx')
+
+    def test_featured_products(self):
+        queryset = Product.objects.filter(is_active=True, in_stock=True)
+        self.assertUsesIndex(queryset.order_by('-created_at')[:8], 'product_featured_idx')
+
+    def test_item_code_search(self):
+        # The unique constraint's index; its name depends on the backend
+        index = 'products_product_item_code' if connection.vendor == 'postgresql' else 'sqlite_autoindex_products_product'
+        self.assertUsesIndex(self.list_view_queryset({'search': '100042'})[:20], index)
+
+    @skipUnless(connection.vendor == 'postgresql', 'full-text search only has an index on PostgreSQL')
+    def test_text_search(self):
+        self.assertUsesIndex(self.list_view_queryset({'search': 'x042'})[:20], 'product_search_vector_gin')
+
+    @skipUnless(connection.vendor == 'postgresql', 'full-text search only has an index on PostgreSQL')
+    def test_filtered_text_search(self):
+        queryset = self.list_view_queryset({'search': 'x042', 'category': self.category.id, 'in_stock': 'true'})
+        self.assertUsesIndex(queryset[:20], 'product_search_vector_gin')
+
+
+class ProductSearchTests(TestCase):
+    """Full-text search: prefix terms ANDed together, most relevant first"""
+
+    @classmethod
+    def setUpTestData(cls):
+        grain = Category.objects.create(name='Grain Market', slug='grain-market')
+        spices = Category.objects.create(name='Spices', slug='spices', description='Masalas and seasonings')
+        cls.basmati = Product.objects.create(
+            item_code='10001', name='GM BASMATI RICE 10LB', description='Aged long grain rice',
+            category=grain, unit='lb', brand='GM',
+        )
+        cls.sona = Product.objects.create(
+            item_code='10002', name='SONA MASOORI 20LB', description='Basmati style rice from Andhra',
+            category=grain, unit='lb', origin='India',
+        )
+        cls.cumin = Product.objects.create(
+            item_code='10003', name='CUMIN SEEDS 7OZ', description='Whole jeera',
+            category=spices, unit='oz', brand='Deep', origin='Nepal',
+        )
+
+    def search(self, text):
+        return list(search_products(Product.objects.all(), text))
+
+    def test_terms_match_as_prefixes(self):
+        self.assertEqual(self.search('basm'), [self.basmati, self.sona])
+        self.assertEqual(self.search('cum see'), [self.cumin])
+
+    def test_terms_are_anded(self):
+        self.assertEqual(self.search('rice cumin'), [])
+        self.assertEqual(self.search('gm rice'), [self.basmati])
+
+    def test_description_and_origin_match(self):
+        self.assertEqual(self.search('jeera'), [self.cumin])
+        self.assertEqual(self.search('nepal'), [self.cumin])
+        self.assertEqual(self.search('seasoning'), [self.cumin])
+
+    @skipUnless(connection.vendor == 'postgresql', 'full-text terms match word prefixes only')
+    def test_mid_word_terms_do_not_match(self):
+        # The substring fallback matches 'asmati' inside BASMATI
+        self.assertEqual(self.search('asmati'), [])
+
+    @skipUnless(connection.vendor == 'postgresql', 'ranks by search_vector weights')
+    def test_name_hits_rank_above_description_hits(self):
+        self.assertEqual(self.search('basmati'), [self.basmati, self.sona])
+        self.assertGreater(
+            search_products(Product.objects.all(), 'basmati').get(pk=self.basmati.pk).search_rank,
+            search_products(Product.objects.all(), 'basmati').get(pk=self.sona.pk).search_rank,
+        )
+
+    @skipUnless(connection.vendor == 'postgresql', 'search_vector is only maintained on PostgreSQL')
+    def test_save_writes_the_vector_in_one_query(self):
+        self.cumin.name = 'JEERA WHOLE 7OZ'
+        with self.assertNumQueries(1):
+            self.cumin.save()
+        self.assertEqual(self.search('whole jee'), [self.cumin])
+
+        Category.objects.filter(pk=self.cumin.category_id).update(name='Masala')
+        self.cumin.save(update_fields=['category'])
+        self.assertEqual(self.search('masala'), [self.cumin])
+
+
+class ItemCodeSearchTests(TestCase):
+    """Code-shaped searches go through the item_code index, text search is the fallback"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.spices = Category.objects.create(name='Spices', slug='spices')
+        cls.nonfood = Category.objects.create(name='Nonfood', slug='nonfood')
+        for item_code, name, category in [
+            ('100011', 'CUMIN SEEDS 7OZ', cls.spices),
+            ('10001', 'GARAM MASALA 100G', cls.spices),
+            ('100010', 'CHILLI POWDER 400G', cls.spices),
+            ('20001', 'CORIANDER POWDER 7OZ', cls.spices),
+            ('30005', 'BRASS LAMP MODEL 20001', cls.nonfood),
+        ]:
+            Product.objects.create(item_code=item_code, name=name, category=category, unit='each')
+
+    def setUp(self):
+        search_result_cache.entries.clear()
+
+    def search(self, **params):
+        response = self.client.get('/api/products/', params)
+        self.assertEqual(response.status_code, 200)
+        return [product['item_code'] for product in response.json()['results']]
+
+    def test_exact_code_first_then_prefix_matches(self):
+        self.assertEqual(self.search(search='10001'), ['10001', '100010', '100011'])
+        self.assertEqual(self.search(search=' 1000 '), ['10001', '100010', '100011'])
+
+    def test_code_lookup_is_one_page_query_and_a_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.search(search='20001'), ['20001'])
+        product_queries = [query for query in queries if 'products_product' in query['sql']]
+        self.assertEqual(len(product_queries), 2)
+
+    def test_filters_apply_before_the_fallback_decision(self):
+        # 20001 is a code in Spices, but only text matches it in Nonfood
+        self.assertEqual(self.search(search='20001', category=self.nonfood.id), ['30005'])
+        self.assertEqual(self.search(search='20001', category=self.spices.id), ['20001'])
+
+    def test_unknown_code_falls_back_to_text_search(self):
+        # No code starts with 400, but CHILLI POWDER 400G matches as text
+        self.assertEqual(self.search(search='400'), ['100010'])
+        self.assertEqual(self.search(search='999'), [])
+        response = self.client.get(
+            '/api/products/search/', {'search': '20001', 'category': self.nonfood.id, 'in_stock': 'true'}
+        )
+        self.assertEqual([product['item_code'] for product in response.json()['results']], ['30005'])
+
+
+class ProductFacetsTests(TestCase):
+    """?facets=true adds counts over the filtered results from one GROUP BY"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.spices, cls.grains = Category.objects.bulk_create([
+            Category(name='Spices', slug='spices'),
+            Category(name='Grains', slug='grains'),
+        ])
+        Product.objects.bulk_create([
+            Product(item_code='10001', name='CUMIN SEEDS 7OZ', category=cls.spices, unit='oz',
+                    brand='Deep', origin='India'),
+            Product(item_code='10002', name='GARAM MASALA 100G', category=cls.spices, unit='each',
+                    brand='Deep', origin='India', in_stock=False),
+            Product(item_code='10003', name='CHILLI POWDER 400G', category=cls.spices, unit='each',
+                    brand='Swad', origin='Nepal'),
+            Product(item_code='10004', name='BASMATI RICE 10LB', category=cls.grains, unit='lb',
+                    brand='Swad'),
+            Product(item_code='10005', name='OLD PICKLE 1KG', category=cls.grains, unit='each',
+                    brand='Deep', is_active=False),
+        ])
+        update_search_vectors()
+
+    def setUp(self):
+        search_result_cache.entries.clear()
+
+    def facets(self, path='/api/products/', **params):
+        response = self.client.get(path, {'facets': 'true', **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['facets']
+
+    def test_counts(self):
+        self.assertEqual(self.facets(), {
+            'category': [
+                {'id': self.spices.id, 'name': 'Spices', 'count': 3},
+                {'id': self.grains.id, 'name': 'Grains', 'count': 1},
+            ],
+            'brand': [{'value': 'Deep', 'count': 2}, {'value': 'Swad', 'count': 2}],
+            'origin': [{'value': 'India', 'count': 2}, {'value': 'Nepal', 'count': 1}],
+            'in_stock': [{'value': True, 'count': 3}, {'value': False, 'count': 1}],
+        })
+
+    def test_only_when_asked(self):
+        self.assertNotIn('facets', self.client.get('/api/products/').json())
+        self.assertNotIn('facets', self.client.get('/api/products/', {'facets': 'no'}).json())
+
+    def test_facets_respect_the_active_filters(self):
+        facets = self.facets(brand='Swad')
+        self.assertEqual(facets['category'], [
+            {'id': self.spices.id, 'name': 'Spices', 'count': 1},
+            {'id': self.grains.id, 'name': 'Grains', 'count': 1},
+        ])
+        self.assertEqual(facets['origin'], [{'value': 'Nepal', 'count': 1}])
+
+        facets = self.facets('/api/products/search/', search='masala', category=self.spices.id, in_stock='false')
+        self.assertEqual(facets['brand'], [{'value': 'Deep', 'count': 1}])
+        self.assertEqual(facets['in_stock'], [{'value': False, 'count': 1}])
+
+    def test_facets_are_one_group_by_query(self):
+        self.client.get('/api/products/')
+        search_result_cache.entries.clear()
+        with CaptureQueriesContext(connection) as without_facets:
+            self.client.get('/api/products/', {'category': self.spices.id})
+        with CaptureQueriesContext(connection) as with_facets:
+            self.facets(category=self.spices.id)
+        self.assertEqual(len(with_facets), len(without_facets) + 1)
+        self.assertIn('GROUP BY', with_facets[-1]['sql'])
+
+
+class ProductKeysetPaginationTests(TestCase):
+    """?pagination=cursor walks the listing in (category, name, id) order"""
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = [
+            Category.objects.create(name=name, slug=name.lower()) for name in ['Spices', 'Grains']
+        ]
+        for index in range(7):
+            Product.objects.create(
+                item_code=str(50000 + index), name=f'ITEM {index % 3}',
+                category=categories[index % 2], unit='each',
+            )
+        cls.expected = list(
+            Product.objects.order_by('category_id', 'name', 'id').values_list('item_code', flat=True)
+        )
+
+    def test_pages_follow_the_cursor(self):
+        item_codes = []
+        url, params = '/api/products/', {'pagination': 'cursor', 'page_size': 3, 'count': 'true'}
+        while url:
+            data = self.client.get(url, params).json()
+            item_codes.extend(product['item_code'] for product in data['results'])
+            if params:
+                self.assertEqual(data['count'], 7)
+            else:
+                self.assertNotIn('count', data)
+            url, params = data['next'], None
+        self.assertEqual(item_codes, self.expected)
+
+    def test_page_size_parsing(self):
+        for page_size, expected in [('2', 2), ('0', 7), ('-1', 7), ('x', 7), ('500', 7)]:
+            data = self.client.get('/api/products/', {'pagination': 'cursor', 'page_size': page_size}).json()
+            self.assertEqual(len(data['results']), expected, page_size)
+
+    def test_search_and_ordering_are_rejected(self):
+        for params in [{'search': 'item'}, {'ordering': '-name'}]:
+            response = self.client.get('/api/products/', dict(params, pagination='cursor'))
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(list(params)[0], response.json())
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/products/', {'cursor': 'not-a-cursor'}).status_code, 404)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CatalogConditionalTests(TestCase):
+    """Catalog endpoints answer conditional GETs from the catalog version"""
+
+    urls = ['/api/products/', '/api/products/categories/', '/api/products/featured/', '/api/products/stats/']
+
+    @classmethod
+    def setUpTestData(cls):
+        # Bulk creates skip the signals, so no bump is pending when a test starts
+        cls.category, = Category.objects.bulk_create([Category(name='Spices', slug='spices')])
+        cls.product, = Product.objects.bulk_create([
+            Product(item_code='10001', name='CUMIN', category=cls.category, unit='oz')
+        ])
+
+    def setUp(self):
+        default_cache.clear()
+        self.addCleanup(default_cache.clear)
+
+    def test_etag_and_last_modified_give_304(self):
+        version, updated_at = get_catalog_version()
+        for url in self.urls:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(response['ETag'], f'"catalog-{version}"')
+            self.assertIn('Last-Modified', response)
+
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=f'"catalog-{version}"')
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(response.content, b'')
+
+            last_modified = self.client.get(url)['Last-Modified']
+            self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_a_write_changes_the_etag(self):
+        etag = self.client.get('/api/products/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'CUMIN SEEDS'
+            self.product.save()
+
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['results'][0]['name'], 'CUMIN SEEDS')
+
+    def test_one_bump_per_transaction(self):
+        version, updated_at = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                for index in range(5):
+                    Product.objects.create(
+                        item_code=str(20000 + index), name='CHILLI', category=self.category, unit='oz'
+                    )
+                self.category.save()
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(get_catalog_version()[0], version + 1)
+
+    def test_bump_publishes_the_committed_version(self):
+        version, updated_at = get_catalog_version()
+        self.assertEqual(bump_catalog_version()[0], version + 1)
+        state = bump_catalog_version()
+        self.assertEqual(get_catalog_version(), state)
+        self.assertEqual(CatalogVersion.objects.get(pk=1).version, version + 2)
+
+
+class SuggestIndexTests(TestCase):
+    """The typeahead prefix index ranks every match and rebuilds off the request path"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Spices', slug='spices')
+        Product.objects.bulk_create([
+            Product(item_code=str(60000 + index), name=f'AAM PAPAD {index:03d}', category=category, unit='each')
+            for index in range(600)
+        ] + [
+            Product(item_code='AB-12/5', name='ZAFRAN 1G', category=category, unit='g', brand='AZAD'),
+            Product(item_code='70001', name="MOTHER'S RECIPE PICKLE", category=category, unit='g'),
+        ])
+
+    def values(self, index, prefix, limit=3):
+        return [suggestion['value'] for suggestion in index.lookup(prefix, limit)]
+
+    def test_short_prefixes_rank_all_matches(self):
+        # AZAD sorts after 600 AAM PAPAD keys but is a brand, so it ranks first
+        self.assertEqual(self.values(PrefixIndex.build(), 'a'), ['AZAD', 'AAM PAPAD 000', 'AAM PAPAD 001'])
+
+    def test_item_codes_are_normalized_like_prefixes(self):
+        index = PrefixIndex.build()
+        for prefix in ['ab-1', 'AB-12/', 'ab12', 'ab 12 5']:
+            self.assertEqual(self.values(index, prefix), ['AB-12/5'], prefix)
+        self.assertEqual(self.values(index, "mother's re"), ["MOTHER'S RECIPE PICKLE"])
+
+    def test_catalog_change_rebuilds_in_the_background(self):
+        old = PrefixIndex([], version=-1)
+        new = PrefixIndex([], version=0)
+        with mock.patch.multiple(suggest, _index=old, _checked_at=0.0, _rebuild=None), \
+                mock.patch.object(PrefixIndex, 'build', return_value=new) as build, \
+                mock.patch.object(suggest, 'get_catalog_version', return_value=(0, None)):
+            # The request that notices the new version still gets the old index
+            self.assertIs(get_suggest_index(), old)
+            suggest._rebuild.join()
+            build.assert_called_once_with(version=0)
+            self.assertIs(suggest._index, new)
+
+
+class SparseFieldsTests(TestCase):
+    """?fields= and ?compact= trim top-level product serializers only"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Spices', slug='spices')
+        cls.product = Product.objects.create(
+            item_code='10001', name='CUMIN', description='Whole', category=category, unit='oz'
+        )
+
+    def request(self, **params):
+        return Request(APIRequestFactory().get('/api/cart/', params))
+
+    def test_top_level_products_are_trimmed(self):
+        context = {'request': self.request(fields='id,name')}
+        self.assertEqual(ProductListSerializer(self.product, context=context).data, {'id': self.product.id, 'name': 'CUMIN'})
+        self.assertEqual(
+            ProductListSerializer([self.product], many=True, context=context).data,
+            [{'id': self.product.id, 'name': 'CUMIN'}]
+        )
+
+    def test_nested_products_keep_their_shape(self):
+        user = get_user_model().objects.create_user(username='buyer', password='secret')
+        item = CartItem.objects.create(cart=Cart.objects.create(user=user), product=self.product, quantity=1)
+        full = ProductListSerializer(self.product).data
+        for params in [{'fields': 'id,quantity'}, {'compact': 'true'}]:
+            context = {'request': self.request(**params)}
+            # CartItemSerializer as the root, alone and as a list
+            self.assertEqual(CartItemSerializer(item, context=context).data['product'], full, params)
+            self.assertEqual(CartItemSerializer([item], many=True, context=context).data[0]['product'], full)
+
+
+class FastSerializerParityTests(TestCase):
+    """FAST_READ_SERIALIZERS must not change a single byte of any response"""
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = [
+            Category.objects.create(name=name, slug=name.lower(), description=f'{name} products')
+            for name in ['Spices', 'Grains']
+        ]
+        cls.products = [
+            Product.objects.create(
+                item_code=str(10000 + index), name=f'PRODUCT {index}', description=f'Item {index}',
+                category=categories[index % 2], unit='lb', brand='GM' if index % 2 else '',
+                in_stock=index % 3 != 0, stock_quantity=Decimal(index) + Decimal('0.5'),
+                min_order_quantity=Decimal('2'), weight=Decimal('10.25') if index % 2 else None,
+            )
+            for index in range(6)
+        ]
+        cls.user = get_user_model().objects.create_user(username='buyer', password='secret')
+        cart = Cart.objects.create(user=cls.user)
+        for product in cls.products[:4]:
+            CartItem.objects.create(cart=cart, product=product, quantity=2)
+
+    def setUp(self):
+        search_result_cache.entries.clear()
+        self.client.force_login(self.user)
+
+    def assertSameResponses(self, url, params=None):
+        responses = []
+        for fast in (False, True):
+            with self.settings(FAST_READ_SERIALIZERS=fast):
+                response = self.client.get(url, params or {})
+            self.assertEqual(response.status_code, 200, url)
+            responses.append(response.content)
+        self.assertEqual(responses[0], responses[1], f'{url} {params}')
+
+    def test_product_list(self):
+        for params in [{}, {'compact': 'true'}, {'fields': 'id,name,category'}, {'compact': 'true', 'expand': 'category'}]:
+            self.assertSameResponses('/api/products/', params)
+
+    def test_product_detail(self):
+        self.assertSameResponses(f'/api/products/{self.products[1].id}/')
+        self.assertSameResponses(f'/api/products/{self.products[2].id}/', {'compact': 'true'})
+
+    def test_featured_products(self):
+        self.assertSameResponses('/api/products/featured/')
+        self.assertSameResponses('/api/products/featured/', {'fields': 'id,stock_quantity'})
+
+    def test_cart(self):
+        self.assertSameResponses('/api/cart/')
+        self.assertSameResponses('/api/cart/', {'compact': 'true'})
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class FeaturedProductsCacheTests(TestCase):
+    """Featured products are cached as rendered JSON under normalized keys"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.spices, cls.grains = [
+            Category.objects.create(name=name, slug=name.lower()) for name in ['Spices', 'Grains']
+        ]
+        for index in range(4):
+            Product.objects.create(
+                item_code=str(10000 + index), name=f'PRODUCT {index}',
+                category=cls.spices if index % 2 else cls.grains, unit='lb',
+            )
+
+    def setUp(self):
+        default_cache.clear()
+        self.addCleanup(default_cache.clear)
+
+    def cached_keys(self):
+        # LocMemCache keys look like ':1:products:featured:v<version>:<rest>'
+        return sorted(
+            key.partition('products:featured:')[2].split(':', 1)[1]
+            for key in default_cache._cache if 'products:featured:' in key
+        )
+
+    def test_cached_bytes_are_served(self):
+        response = self.client.get('/api/products/featured/')
+        version, updated_at = get_catalog_version()
+        self.assertEqual(default_cache.get(f'products:featured:v{version}:all:*:0:0'), response.content)
+
+        with self.assertNumQueries(0):
+            # The catalog version is cached too, so a hit never reaches the database
+            self.assertEqual(self.client.get('/api/products/featured/').content, response.content)
+
+    def test_per_category_variant(self):
+        data = self.client.get('/api/products/featured/', {'category': self.spices.id}).json()
+        self.assertEqual({product['category']['id'] for product in data}, {self.spices.id})
+        self.assertEqual(len(self.client.get('/api/products/featured/').json()), 4)
+        self.client.get('/api/products/featured/', {'category': f'00{self.spices.id}'})
+        self.assertEqual(len(self.cached_keys()), 2)
+
+    def test_invalid_category_is_rejected(self):
+        for category in ('0', '000', '-1', 'spices', '\u0663'):
+            response = self.client.get('/api/products/featured/', {'category': category})
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.cached_keys(), [])
+
+    def test_sparse_params_are_normalized(self):
+        variants = [
+            {'fields': 'id,name'},
+            {'fields': 'name, id,name,bogus field\x07', 'compact': 'FALSE'},
+            {'fields': 'name,id', 'expand': 'nothing', 'junk': 'x' * 500},
+        ]
+        contents = {self.client.get('/api/products/featured/', params).content for params in variants}
+        self.assertEqual(len(contents), 1)
+        self.client.get('/api/products/featured/', {'compact': 'true', 'expand': 'category'})
+        self.assertEqual(self.cached_keys(), ['all:*:1:1', 'all:id,name:0:0'])
+
+
+class ProductBulkLookupTests(TestCase):
+    """POST /api/products/bulk/ resolves ids and item codes in request order"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category, = Category.objects.bulk_create([Category(name='Spices', slug='spices')])
+        cls.cumin, cls.masala, cls.chilli, cls.retired = Product.objects.bulk_create([
+            Product(item_code='10001', name='CUMIN SEEDS 7OZ', category=category, unit='oz'),
+            Product(item_code='10002', name='GARAM MASALA 100G', category=category, unit='each'),
+            Product(item_code='10003', name='CHILLI POWDER 400G', category=category, unit='each'),
+            Product(item_code='10004', name='OLD PICKLE 1KG', category=category, unit='each', is_active=False),
+        ])
+
+    def lookup(self, data):
+        return self.client.post('/api/products/bulk/', data, content_type='application/json')
+
+    def test_results_follow_the_request_order(self):
+        response = self.lookup({'ids': [self.chilli.id, self.cumin.id, self.chilli.id]})
+        self.assertEqual([product['item_code'] for product in response.json()['results']], ['10003', '10001'])
+
+        response = self.lookup({'item_codes': ['10002', ' 10003'], 'ids': [self.cumin.id, self.masala.id]})
+        self.assertEqual(
+            [product['item_code'] for product in response.json()['results']], ['10002', '10003', '10001']
+        )
+
+    def test_one_query(self):
+        with self.assertNumQueries(1):
+            self.lookup({'ids': [self.cumin.id], 'item_codes': ['10002', '10003']})
+
+    def test_misses_are_reported(self):
+        response = self.lookup({'ids': [self.cumin.id, 999999, self.retired.id], 'item_codes': ['10002', 'NOPE']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['missing'], {'ids': [999999, self.retired.id], 'item_codes': ['NOPE']})
+        self.assertEqual([product['item_code'] for product in response.json()['results']], ['10001', '10002'])
+
+    def test_limits(self):
+        self.assertEqual(self.lookup({}).status_code, 400)
+        self.assertEqual(self.lookup({'ids': list(range(1, 502))}).status_code, 400)
+        self.assertEqual(self.lookup({'ids': list(range(1, 301)), 'item_codes': ['X'] * 201}).status_code, 400)
+        self.assertEqual(self.lookup({'ids': list(range(1, 301)), 'item_codes': ['X'] * 200}).status_code, 200)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ProductStatsTests(TestCase):
+    """Catalog statistics come from one grouped query and are cached until a write commits"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.spices, cls.grains, cls.retired = Category.objects.bulk_create([
+            Category(name='Spices', slug='spices'),
+            Category(name='Grains', slug='grains'),
+            Category(name='Retired', slug='retired', is_active=False),
+        ])
+        cls.cumin, _, _, _ = Product.objects.bulk_create([
+            Product(item_code='10001', name='CUMIN SEEDS 7OZ', category=cls.spices, unit='oz', stock_quantity=50),
+            Product(item_code='10002', name='GARAM MASALA 100G', category=cls.spices, unit='each',
+                    in_stock=False),
+            Product(item_code='10003', name='BASMATI RICE 10LB', category=cls.grains, unit='lb', stock_quantity=5),
+            Product(item_code='10004', name='OLD PICKLE 1KG', category=cls.grains, unit='each', is_active=False),
+        ])
+
+    def setUp(self):
+        default_cache.clear()
+        self.addCleanup(default_cache.clear)
+
+    def test_stats_are_one_grouped_query(self):
+        with self.assertNumQueries(1):
+            stats = compute_product_stats()
+        self.assertEqual(stats, {
+            'total_products': 3,
+            'total_categories': 2,
+            'in_stock_products': 2,
+            'low_stock_products': 2,
+            'category_breakdown': [
+                {'category': 'Grains', 'product_count': 1},
+                {'category': 'Spices', 'product_count': 2},
+            ],
+        })
+
+    def test_view_serves_cached_stats(self):
+        first = self.client.get('/api/products/stats/')
+        self.assertEqual(first.json()['total_products'], 3)
+        self.assertEqual(default_cache.get(PRODUCT_STATS_CACHE_KEY), first.json())
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/products/stats/').json(), first.json())
+
+    def test_product_write_invalidates_the_cache_on_commit(self):
+        self.client.get('/api/products/stats/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cumin.in_stock = False
+            self.cumin.save()
+            # Readers keep the cached stats until the write commits
+            self.assertIsNotNone(default_cache.get(PRODUCT_STATS_CACHE_KEY))
+        self.assertIsNone(default_cache.get(PRODUCT_STATS_CACHE_KEY))
+        self.assertEqual(self.client.get('/api/products/stats/').json()['in_stock_products'], 1)
+
+    def test_category_write_invalidates_the_cache_on_commit(self):
+        self.client.get('/api/products/stats/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.grains.is_active = False
+            self.grains.save()
+        self.assertIsNone(default_cache.get(PRODUCT_STATS_CACHE_KEY))
+        self.assertEqual(self.client.get('/api/products/stats/').json()['total_categories'], 1)
+
+
+@override_settings(PRODUCT_EXPORT_PARTNER_TOKENS=['partner-secret'])
+class ProductExportTests(TestCase):
+    """The catalog export is limited to staff and partners and streams every active product"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Spices', slug='spices')
+        Product.objects.bulk_create([
+            Product(
+                item_code=str(10000 + index), name=f'PRODUCT, "{index}"', category=category, unit='lb',
+                stock_quantity=Decimal('2.5'), is_active=index != 0,
+            )
+            for index in range(5)
+        ])
+
+    def export(self, **params):
+        return self.client.get('/api/products/export/', params, HTTP_X_PARTNER_TOKEN='partner-secret')
+
+    def test_requires_a_partner_token_or_staff(self):
+        self.assertEqual(self.client.get('/api/products/export/').status_code, 403)
+        response = self.client.get('/api/products/export/', HTTP_X_PARTNER_TOKEN='wrong')
+        self.assertEqual(response.status_code, 403)
+
+        self.client.force_login(get_user_model().objects.create_user(username='buyer', password='secret'))
+        self.assertEqual(self.client.get('/api/products/export/').status_code, 403)
+        self.client.force_login(get_user_model().objects.create_user(username='staff', password='secret', is_staff=True))
+        self.assertEqual(self.client.get('/api/products/export/').status_code, 200)
+
+    def test_ndjson(self):
+        response = self.export()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['item_code'] for row in rows], ['10001', '10002', '10003', '10004'])
+        self.assertEqual(rows[0]['name'], 'PRODUCT, "1"')
+        self.assertEqual((rows[0]['category'], rows[0]['stock_quantity']), ('Spices', '2.50'))
+
+    def test_csv(self):
+        response = self.export(type='csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([row['item_code'] for row in rows], ['10001', '10002', '10003', '10004'])
+        self.assertEqual(rows[0]['name'], 'PRODUCT, "1"')
+
+    def test_unknown_type(self):
+        self.assertEqual(self.export(type='xml').status_code, 400)
+
+
+class ProductChangesTests(TestCase):
+    """The changes feed delivers every committed write once, in commit order"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # bulk_create, so no catalog bump is left pending in the test transaction
+        cls.category, = Category.objects.bulk_create([Category(name='Spices', slug='spices')])
+        Product.objects.bulk_create([
+            Product(item_code=str(10000 + index), name=f'PRODUCT {index}', category=cls.category, unit='lb')
+            for index in range(5)
+        ])
+        bump_catalog_version()
+        cls.products = list(Product.objects.order_by('id'))
+
+    def changes(self, since='', **params):
+        response = self.client.get('/api/products/changes/', {'since': since, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def sync(self, since='', limit=2):
+        """Follow the feed to its end; returns the product ids seen and the final cursor"""
+        seen = []
+        while True:
+            page = self.changes(since, limit=limit)
+            seen.extend(product['id'] for product in page['products'])
+            seen.extend(page['deleted']['products'])
+            since = page['next']
+            if not page['has_more']:
+                return seen, since
+
+    def test_pages_through_a_full_sync(self):
+        seen, cursor = self.sync()
+        self.assertEqual(seen, [product.id for product in self.products])
+        self.assertEqual(self.sync(cursor), ([], cursor))
+
+    def test_deactivated_products_are_tombstones(self):
+        seen, cursor = self.sync()
+        product = self.products[1]
+        product.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+
+        page = self.changes(cursor)
+        self.assertEqual(page['products'], [])
+        self.assertEqual(page['deleted'], {'products': [product.id], 'categories': []})
+
+    def test_rows_are_unpublished_until_the_version_bump(self):
+        seen, cursor = self.sync()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.products[0].save(update_fields=['name'])
+        self.assertIsNone(Product.objects.get(pk=self.products[0].pk).catalog_version)
+        self.assertEqual(self.sync(cursor)[0], [])
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.sync(cursor)[0], [self.products[0].id])
+
+    def test_late_commit_with_an_older_timestamp_is_delivered(self):
+        seen, cursor = self.sync()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[4].save()
+        seen, cursor = self.sync(cursor)
+        self.assertEqual(seen, [self.products[4].id])
+
+        # Written before the product above but committed after the client
+        # polled, as in a long import transaction
+        Product.objects.filter(pk=self.products[0].pk).update(
+            catalog_version=None, updated_at=timezone.now() - timedelta(hours=1)
+        )
+        bump_catalog_version()
+        self.assertEqual(self.sync(cursor)[0], [self.products[0].id])
+
+    def test_timestamp_since(self):
+        Product.objects.filter(pk=self.products[0].pk).update(updated_at=timezone.now() - timedelta(days=1))
+        Product.objects.exclude(pk=self.products[0].pk).update(updated_at=timezone.now())
+        since = (timezone.now() - timedelta(hours=1)).replace(microsecond=0)
+
+        expected = sorted(product.id for product in self.products)
+        for value in (since.isoformat(), since.isoformat().replace('+00:00', 'Z')):
+            self.assertEqual(sorted(self.sync(value)[0]), expected)
+        # An unencoded '+' offset arrives as a space
+        response = self.client.get(f'/api/products/changes/?since={since.isoformat()}')
+        self.assertEqual(response.status_code, 200)
+
+        # Nothing written since: the feed starts at the current version
+        later = (timezone.now() + timedelta(hours=1)).isoformat().replace('+00:00', 'Z')
+        self.assertEqual(sorted(self.sync(later)[0]), expected)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[2].save()
+        self.assertEqual(self.sync(self.changes(later)['next'])[0], [])
+
+    def test_version_since(self):
+        version, updated_at = get_catalog_version()
+        self.assertEqual(self.sync(str(version))[0], [product.id for product in self.products])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[2].save()
+        self.assertEqual(self.sync(str(version + 1))[0], [self.products[2].id])
+        # Eight digits are a version too, not a basic-format date
+        self.assertEqual(self.sync('20261017')[0], [])
+
+    def test_invalid_cursors(self):
+        for since in (
+            'not-a-cursor',
+            urlsafe_b64encode(b'{"products": [1, 2]}').decode(),
+            urlsafe_b64encode(b'{"products": ["2024-01-01T00:00:00", 2], "categories": null}').decode(),
+            urlsafe_b64encode(b'{"products": [-1, 0], "categories": [0, 0]}').decode(),
+        ):
+            response = self.client.get('/api/products/changes/', {'since': since})
+            self.assertEqual(response.status_code, 400, since)
+        self.assertEqual(self.client.get('/api/products/changes/', {'limit': '0'}).status_code, 400)
+
+
+def trigram_available():
+    """Whether the pg_trgm extension is installed in the test database"""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+class FuzzySearchTests(TestCase):
+    """mode=fuzzy: trigram matching on name and brand, with a tunable threshold"""
+
+    @classmethod
+    def setUpTestData(cls):
+        grain, = Category.objects.bulk_create([Category(name='Grain Market', slug='grain-market')])
+        cls.basmati, cls.sona, cls.dal = Product.objects.bulk_create([
+            Product(item_code='10001', name='GM BASMATI RICE 10LB', category=grain, unit='lb', brand='GM'),
+            Product(item_code='10002', name='SONA MASOORI 20LB', category=grain, unit='lb'),
+            Product(item_code='10003', name='TOOR DAL 4LB', category=grain, unit='lb', brand='Deep'),
+        ])
+
+    def setUp(self):
+        search_result_cache.entries.clear()
+
+    def search(self, **params):
+        response = self.client.get('/api/products/search/', {'mode': 'fuzzy', 'in_stock': 'true', **params})
+        self.assertEqual(response.status_code, 200)
+        return [product['item_code'] for product in response.json()['results']]
+
+    def require_trigram(self):
+        if not trigram_available():
+            self.skipTest('needs PostgreSQL with pg_trgm')
+
+    def test_threshold_must_be_between_0_and_1(self):
+        for threshold in ('1.5', '-0.1', 'high'):
+            response = self.client.get(
+                '/api/products/search/', {'search': 'basmati', 'mode': 'fuzzy', 'threshold': threshold}
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('threshold', response.json())
+
+    def test_unknown_mode_is_rejected(self):
+        response = self.client.get('/api/products/search/', {'search': 'basmati', 'mode': 'soundex'})
+        self.assertEqual(response.status_code, 400)
+
+    @skipUnless(connection.vendor != 'postgresql', 'the fallback only applies off PostgreSQL')
+    def test_falls_back_to_full_text_search(self):
+        self.assertEqual(self.search(search='basm'), ['10001'])
+
+    def test_misspellings_match_ordered_by_similarity(self):
+        self.require_trigram()
+        self.assertEqual(self.search(search='basmathi'), ['10001'])
+        self.assertEqual(self.search(search='daal'), ['10003'])
+        self.assertEqual(self.search(search='10002'), ['10002'])
+
+    @override_settings(PRODUCT_FUZZY_SEARCH_THRESHOLD=0.7)
+    def test_threshold_defaults_to_the_setting(self):
+        self.require_trigram()
+        with mock.patch('products.views.set_fuzzy_threshold', wraps=set_fuzzy_threshold) as set_threshold:
+            self.search(search='basmathi')
+            self.search(search='masoor', threshold='0.2')
+        self.assertEqual(set_threshold.call_args_list, [mock.call(0.7), mock.call(0.2)])
+
+
+class SearchResultCacheTests(TestCase):
+    """The per-process search result cache and the JSON responses it serves"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category, = Category.objects.bulk_create([Category(name='Spices', slug='spices')])
+        Product.objects.bulk_create([
+            Product(item_code='10001', name='GARAM MASALA 100G', category=category, unit='each'),
+            Product(item_code='10002', name='GARAM MASALA 200G', category=category, unit='each'),
+        ])
+
+    def setUp(self):
+        search_result_cache.entries.clear()
+        search_result_cache.hits = search_result_cache.misses = 0
+
+    def test_least_recently_used_entry_is_evicted(self):
+        results = SearchResultCache(2)
+        for key in ('a', 'b'):
+            results.get(1, key)
+            results.set(1, key, key.encode())
+        self.assertEqual(results.get(1, 'a'), b'a')
+        results.set(1, 'c', b'c')
+        self.assertIsNone(results.get(1, 'b'))
+        self.assertEqual((results.get(1, 'a'), results.get(1, 'c')), (b'a', b'c'))
+
+    def test_new_version_drops_entries(self):
+        results = SearchResultCache(2)
+        results.get(1, 'a')
+        results.set(1, 'a', b'a')
+        self.assertIsNone(results.get(2, 'a'))
+        # A response rendered for the old version is not stored
+        results.set(1, 'a', b'a')
+        self.assertIsNone(results.get(2, 'a'))
+        self.assertEqual(results.stats()['size'], 0)
+
+    def test_stats(self):
+        results = SearchResultCache(2)
+        self.assertIsNone(results.stats()['hit_rate'])
+        results.get(1, 'a')
+        results.set(1, 'a', b'a')
+        results.get(1, 'a')
+        results.get(1, 'a')
+        self.assertEqual(results.stats(), {
+            'hits': 2, 'misses': 1, 'hit_rate': 0.6667, 'size': 1, 'maxsize': 2, 'version': 1,
+        })
+
+    def test_disabled_cache_counts_nothing(self):
+        results = SearchResultCache(0)
+        self.assertIsNone(results.get(1, 'a'))
+        results.set(1, 'a', b'a')
+        self.assertEqual((results.stats()['misses'], results.stats()['size']), (0, 0))
+
+    def test_json_hits_are_served_from_the_cache(self):
+        first = self.client.get('/api/products/', {'search': 'garam'})
+        second = self.client.get('/api/products/', {'search': ' GARAM '})
+        self.assertEqual(second['Content-Type'], 'application/json')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual((search_result_cache.hits, search_result_cache.misses), (1, 1))
+
+    def test_other_formats_bypass_the_cache(self):
+        self.client.get('/api/products/', {'search': 'garam'})
+
+        response = self.client.get('/api/products/', {'search': 'garam'}, HTTP_ACCEPT='text/html')
+        self.assertTrue(response['Content-Type'].startswith('text/html'))
+        response = self.client.get('/api/products/', {'search': 'garam', 'format': 'api'})
+        self.assertTrue(response['Content-Type'].startswith('text/html'))
+        self.assertEqual((search_result_cache.hits, search_result_cache.misses), (0, 1))
+
+        # JSON options are part of the key
+        response = self.client.get('/api/products/', {'search': 'garam'}, HTTP_ACCEPT='application/json; indent=4')
+        self.assertIn(b'\n    "count"', response.content)
+        self.assertEqual(search_result_cache.misses, 2)
+
+
+class CatalogClassifierTests(SimpleTestCase):
+    """Unit and brand extraction against the labelled accuracy fixture"""
+
+    fixture = os.path.join(os.path.dirname(__file__), 'fixtures', 'classifier_accuracy.json')
+
+    def test_accuracy_fixture(self):
+        # A hand-labelled random sample of the supplier file; the floors sit
+        # just under the measured accuracy (97% units, 90% brands), which is
+        # limited by brands missing from the dictionary
+        with open(self.fixture, 'r', encoding='utf-8') as file:
+            cases = json.load(file)['cases']
+
+        labels = get_classifier().classify_many([case['name'] for case in cases])
+        for index, field, floor in [(0, 'unit', 0.95), (1, 'brand', 0.88)]:
+            misses = [
+                f"{case['name']}: {label[index]!r} != {case[field]!r}"
+                for case, label in zip(cases, labels) if label[index] != case[field]
+            ]
+            self.assertGreaterEqual(1 - len(misses) / len(cases), floor, '\n'.join(misses))
+
+    def test_whole_words_only(self):
+        classifier = CatalogClassifier(['LG', 'GM'])
+        self.assertEqual(classifier.classify('BULGUR WHEAT COARSE 2LB'), ('lb', ''))
+        self.assertEqual(classifier.classify('GM GARAM MASALA 100G'), ('g', 'GM'))
+        self.assertEqual(classifier.classify('CLAY DIYA 12/CS'), ('box', ''))
+        self.assertEqual(classifier.classify('GLASS TUMBLER'), ('unit', ''))
+
+
+class CatalogSourceTests(SimpleTestCase):
+    """Incremental parsing and normalization of import sources"""
+
+    document = {
+        'metadata': {'categories': ['Organic', 'Grain Market'], 'total_items': 3, 'ratio': 1.25},
+        'items': [
+            {'item_code': '10026', 'item_name': 'BLACK CARDAMOM 7OZ', 'category': 'Mainpage'},
+            {'item_code': '18910', 'item_name': 'GM "SPECIAL" RICE \u00e9 10LB', 'category': 'Grain Market'},
+            {'item_code': 'X1', 'item_name': '', 'category': None},
+        ],
+        'empty': [],
+        'flags': [True, False, None, -3e2],
+    }
+
+    def reader(self):
+        # A tiny chunk size makes every value straddle chunk boundaries
+        text = json.dumps(self.document, indent=2)
+        return JSONStreamReader(io.StringIO(text), chunk_size=3)
+
+    def test_stream_reader_matches_json_load(self):
+        reader = self.reader()
+        parsed = {}
+        for key in reader.iter_keys():
+            if reader.peek() == '[':
+                parsed[key] = list(reader.iter_array())
+            else:
+                parsed[key] = reader.value()
+        self.assertEqual(parsed, self.document)
+
+    def test_stream_reader_skips_members(self):
+        reader = self.reader()
+        keys = []
+        for key in reader.iter_keys():
+            keys.append(key)
+            reader.skip()
+        self.assertEqual(keys, list(self.document))
+
+    def test_normalize_chunk(self):
+        records = [
+            (' 10001 ', ' GM BASMATI RICE 4X10LB ', 'Grain Market', '12.345', 'TRUE'),
+            ('10002', 'CLAY DIYA 12/CS', 'Nonfood', 'n/a', 'FALSE'),
+            ('10003', '', 'Nonfood', '', 'FALSE'),
+            ('10004', 'TEA', '', '', 'FALSE'),
+        ]
+        rows, skipped, timings = normalize_chunk(records, CatalogClassifier(['GM']))
+        self.assertEqual(set(timings), {'parse', 'classify'})
+        self.assertEqual(skipped, [
+            {'item_code': '10003', 'name': '', 'reason': 'missing name'},
+            {'item_code': '10004', 'name': 'TEA', 'reason': 'missing category'},
+        ])
+        self.assertEqual(rows, [
+            ('10001', {
+                'name': 'GM BASMATI RICE 4X10LB', 'category_name': 'Grain Market', 'has_stock_info': True,
+                'stock_quantity': Decimal('12.35'), 'unit': 'lb', 'brand': 'GM',
+            }),
+            ('10002', {
+                'name': 'CLAY DIYA 12/CS', 'category_name': 'Nonfood', 'has_stock_info': False,
+                'stock_quantity': Decimal('0.00'), 'unit': 'box', 'brand': '',
+            }),
+        ])
+
+
+class ImportCatalogTests(TestCase):
+    """``import_catalog`` diffs against the stored catalog and guards deactivation"""
+
+    csv_rows = [
+        'item_number,item_description,product_category,sheet_source,order,stock,price,has_pricing,has_stock_info',
+        '10001,GM BASMATI RICE 4X10LB,Grain Market,GRAIN MARKET PRODUCTS,,5,,FALSE,TRUE',
+        '10002,CLAY DIYA 12/CS,Nonfood,NON-FOOD PRODUCTS,,,,FALSE,FALSE',
+        '10003,MASOOR DAL 4LB,Frozen,FROZEN PRODUCTS,,0,,FALSE,TRUE',
+        ',MISSING CODE,Nonfood,NON-FOOD PRODUCTS,,,,FALSE,FALSE',
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        grain = Category.objects.create(name='Grain Market', slug='grain-market')
+        nonfood = Category.objects.create(name='Nonfood', slug='nonfood')
+        Product.objects.create(
+            item_code='10001', name='GM BASMATI RICE 4X10LB',
+            description='GM BASMATI RICE 4X10LB - Grain Market category',
+            category=grain, unit='lb', in_stock=True, stock_quantity=Decimal('5.00'),
+        )
+        Product.objects.create(
+            item_code='10002', name='CLAY DIYA 12/CS', description='old', category=nonfood, unit='unit',
+            in_stock=False,
+        )
+        Product.objects.create(item_code='10009', name='DISCONTINUED', category=nonfood, unit='unit')
+
+    def run_import(self, *args, rows=None, items=None):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        paths = {name: os.path.join(directory.name, name) for name in ['catalog.csv', 'catalog.json', 'report.json']}
+        with open(paths['catalog.csv'], 'w', encoding='utf-8') as file:
+            file.write('\n'.join(self.csv_rows if rows is None else rows) + '\n')
+        with open(paths['catalog.json'], 'w', encoding='utf-8') as file:
+            json.dump({'metadata': {'categories': ['Grain Market', 'Nonfood']}, 'items': items or []}, file)
+        if items is not None:
+            args += ('--source', paths['catalog.json'])
+
+        call_command(
+            'import_catalog', '--csv-file', paths['catalog.csv'], '--json-file', paths['catalog.json'],
+            '--report', paths['report.json'], '--workers', '1', *args, stdout=io.StringIO()
+        )
+        with open(paths['report.json'], 'r', encoding='utf-8') as file:
+            return json.load(file)
+
+    def test_dry_run_reports_without_writing(self):
+        before = list(Product.objects.order_by('item_code').values())
+        report = self.run_import('--dry-run', '--deactivate-missing')
+
+        self.assertEqual(list(Product.objects.order_by('item_code').values()), before)
+        self.assertFalse(Category.objects.filter(name='Frozen').exists())
+
+        self.assertTrue(report['dry_run'])
+        self.assertEqual(report['categories'], {'new': ['Frozen']})
+        self.assertEqual(report['products']['new'], ['10003'])
+        self.assertEqual(report['products']['changed'], [{'item_code': '10002', 'fields': ['description', 'unit']}])
+        self.assertEqual(report['products']['deactivated'], ['10009'])
+        self.assertEqual(report['summary']['unchanged'], 1)
+        self.assertEqual(report['summary']['skipped'], 1)
+        self.assertEqual(
+            report['products']['skipped'], [{'item_code': '', 'name': 'MISSING CODE', 'reason': 'missing item code'}]
+        )
+        self.assertEqual(report['summary']['rows'], 4)
+        self.assertEqual(set(report['timings']), {'parse', 'classify', 'diff', 'write', 'total'})
+
+    def test_report_matches_the_import(self):
+        dry_run = self.run_import('--dry-run')
+        report = self.run_import()
+
+        self.assertFalse(report['dry_run'])
+        self.assertEqual(report['products'], dry_run['products'])
+        self.assertEqual(Product.objects.get(item_code='10002').unit, 'box')
+        self.assertEqual(self.run_import('--dry-run')['summary']['unchanged'], 3)
+
+    def dry_run_in(self, directory, *args):
+        """Dry run from ``directory`` without a --report path; returns (stdout, stderr)"""
+        csv_file = os.path.join(directory, 'catalog.csv')
+        with open(csv_file, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(self.csv_rows) + '\n')
+        stdout, stderr = io.StringIO(), io.StringIO()
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            call_command(
+                'import_catalog', '--csv-file', csv_file, '--json-file', os.path.join(directory, 'missing.json'),
+                '--dry-run', '--workers', '1', *args, stdout=stdout, stderr=stderr
+            )
+        finally:
+            os.chdir(cwd)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_dry_run_report_defaults_to_a_file(self):
+        self.run_import()
+        with tempfile.TemporaryDirectory() as directory:
+            stdout, stderr = self.dry_run_in(directory)
+            with open(os.path.join(directory, 'import_catalog_report.json'), 'r', encoding='utf-8') as file:
+                self.assertEqual(json.load(file)['summary']['unchanged'], 3)
+        self.assertIn('Report written to import_catalog_report.json', stdout)
+        self.assertNotIn('{', stdout)
+
+    def test_report_on_stdout_keeps_progress_on_stderr(self):
+        self.run_import()
+        with tempfile.TemporaryDirectory() as directory:
+            stdout, stderr = self.dry_run_in(directory, '--report', '-')
+            self.assertEqual(os.listdir(directory), ['catalog.csv'])
+
+        self.assertEqual(json.loads(stdout)['summary']['unchanged'], 3)
+        self.assertIn('Dry run completed', stderr)
+
+    def test_worker_pool_matches_in_process(self):
+        in_process = self.run_import('--dry-run')
+        pooled = self.run_import('--dry-run', '--workers', '2')
+        self.assertEqual(pooled['products'], in_process['products'])
+        self.assertEqual(pooled['summary'], in_process['summary'])
+
+    def test_unchanged_rows_are_not_written(self):
+        self.run_import()
+        written = dict(Product.objects.values_list('item_code', 'updated_at'))
+
+        report = self.run_import()
+        self.assertEqual(report['products']['new'], [])
+        self.assertEqual(report['products']['changed'], [])
+        self.assertEqual(report['summary']['unchanged'], 3)
+        self.assertEqual(dict(Product.objects.values_list('item_code', 'updated_at')), written)
+
+    json_items = [
+        {'item_code': '10001', 'item_name': 'GM BASMATI RICE 4X10LB AGED', 'category': 'Grain Market'},
+        {'item_code': '10004', 'item_name': 'CLAY LAMP', 'category': 'Nonfood'},
+    ]
+
+    def assertStoredStockKept(self):
+        self.assertEqual(
+            {
+                item_code: (in_stock, stock_quantity)
+                for item_code, in_stock, stock_quantity in Product.objects.values_list(
+                    'item_code', 'in_stock', 'stock_quantity'
+                )
+            },
+            {
+                '10001': (True, Decimal('5.00')),
+                '10002': (False, Decimal('0.00')),
+                '10004': (False, Decimal('0.00')),
+                '10009': (True, Decimal('0.00')),
+            }
+        )
+        self.assertEqual(Product.objects.get(item_code='10001').name, 'GM BASMATI RICE 4X10LB AGED')
+
+    def test_json_source_keeps_the_stored_stock(self):
+        # JSON items carry no stock, so they must not mark products out of stock
+        report = self.run_import(rows=self.csv_rows[:1], items=self.json_items)
+        self.assertEqual(report['products']['new'], ['10004'])
+        self.assertEqual(report['products']['changed'], [{'item_code': '10001', 'fields': ['name', 'description']}])
+        self.assertStoredStockKept()
+        self.assertEqual(self.run_import(rows=self.csv_rows[:1], items=self.json_items)['summary']['unchanged'], 2)
+
+    @skipUnless(connection.vendor == 'postgresql', 'the copy engine needs PostgreSQL')
+    def test_copy_engine_json_source_keeps_the_stored_stock(self):
+        self.run_import('--engine', 'copy', rows=self.csv_rows[:1], items=self.json_items)
+        self.assertStoredStockKept()
+
+    def test_deactivate_missing(self):
+        Product.objects.filter(item_code='10002').update(is_active=False)
+        report = self.run_import('--deactivate-missing', '--max-deactivate', '0.5')
+
+        self.assertEqual(report['products']['deactivated'], ['10009'])
+        self.assertEqual(report['products']['reactivated'], ['10002'])
+        self.assertEqual(
+            dict(Product.objects.values_list('item_code', 'is_active')),
+            {'10001': True, '10002': True, '10003': True, '10009': False}
+        )
+
+    def test_large_deactivation_aborts_the_import(self):
+        with self.assertRaisesMessage(CommandError, '1 of 4 active products (25%)'):
+            self.run_import('--deactivate-missing', '--max-deactivate', '0.2')
+        # Nothing from the aborted run was kept
+        self.assertFalse(Product.objects.filter(item_code='10003').exists())
+        self.assertTrue(Product.objects.get(item_code='10009').is_active)
+
+        # A dry run only warns
+        self.assertEqual(
+            self.run_import('--dry-run', '--deactivate-missing', '--max-deactivate', '0.2')['products']['deactivated'],
+            ['10009']
+        )
+
+        self.run_import('--deactivate-missing', '--max-deactivate', '0.2', '--force')
+        self.assertFalse(Product.objects.get(item_code='10009').is_active)
+
+    def test_empty_source_deactivates_nothing(self):
+        # A wrongly delimited file: every row is skipped
+        rows = [row.replace(',', ';') for row in self.csv_rows]
+        for source in (self.csv_rows[:1], rows):
+            with self.assertRaisesMessage(CommandError, 'the sources yielded no products'):
+                self.run_import('--deactivate-missing', '--max-deactivate', '1', rows=source)
+            self.assertEqual(Product.objects.filter(is_active=True).count(), 3)
+
+        # Without --deactivate-missing an empty file is a no-op
+        self.assertEqual(self.run_import(rows=self.csv_rows[:1])['summary']['rows'], 0)
+
+    @skipUnless(connection.vendor == 'postgresql', 'the copy engine needs PostgreSQL')
+    def test_copy_engine_large_deactivation_aborts_the_import(self):
+        with self.assertRaisesMessage(CommandError, '1 of 4 active products (25%)'):
+            self.run_import('--engine', 'copy', '--deactivate-missing', '--max-deactivate', '0.2')
+        self.assertFalse(Product.objects.filter(item_code='10003').exists())
+        self.assertTrue(Product.objects.get(item_code='10009').is_active)
+
+        report = self.run_import('--engine', 'copy', '--deactivate-missing', '--max-deactivate', '0.5')
+        self.assertFalse(Product.objects.get(item_code='10009').is_active)
+        self.assertGreater(report['timings']['write'], 0)
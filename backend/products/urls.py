@@ -10,9 +10,14 @@ urlpatterns = [
     # Product endpoints
     path('', views.ProductListView.as_view(), name='product-list'),
     path('search/', views.ProductSearchView.as_view(), name='product-search'),
+    path('suggest/', views.product_suggest_view, name='product-suggest'),
+    path('bulk/', views.product_bulk_lookup_view, name='product-bulk-lookup'),
     path('<int:pk>/', views.ProductDetailView.as_view(), name='product-detail'),
     
     # Utility endpoints
     path('stats/', views.product_stats_view, name='product-stats'),
     path('featured/', views.featured_products_view, name='featured-products'),
+    path('search-cache/', views.search_cache_stats_view, name='search-cache-stats'),
+    path('export/', views.product_export_view, name='product-export'),
+    path('changes/', views.product_changes_view, name='product-changes'),
 ]
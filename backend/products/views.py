@@ -1,16 +1,124 @@
-from rest_framework import generics, status, filters
+from rest_framework import generics, status
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
+from rest_framework.renderers import JSONRenderer
 from django_filters.rest_framework import DjangoFilterBackend
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 from django.db.models import Q
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from .cache import (
+    FEATURED_PRODUCTS_CACHE_TIMEOUT, catalog_conditional,
+    featured_products_cache_key, get_catalog_version, get_product_stats,
+    search_result_cache, search_result_cache_key
+)
+from .changes import (
+    CHANGES_DEFAULT_LIMIT, CHANGES_MAX_LIMIT, InvalidCursor, decode_cursor,
+    get_changes
+)
+from .export import stream_csv, stream_ndjson
+from .filters import RelevanceOrderingFilter
 from .models import Category, Product
+from .pagination import ProductListPagination
+from .permissions import IsStaffOrPartner
+from .search import (
+    fuzzy_search_products, is_item_code, is_postgresql, product_facets,
+    search_products, set_fuzzy_threshold
+)
 from .serializers import (
     CategorySerializer, ProductListSerializer, 
-    ProductDetailSerializer, ProductSearchSerializer
+    ProductDetailSerializer, ProductSearchSerializer,
+    ProductSuggestSerializer, ProductBulkLookupSerializer,
+    product_list_serializer_class
 )
+from .suggest import get_suggest_index
+
+
+class ProductFacetsMixin:
+    """Adds facet counts to a product list response when ?facets=true"""
+    
+    def paginate_queryset(self, queryset):
+        # Keep the filtered queryset so facets don't repeat the search
+        self.filtered_queryset = queryset
+        return super().paginate_queryset(queryset)
+    
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        
+        if request.query_params.get('facets', '').lower() == 'true' and isinstance(response.data, dict):
+            response.data['facets'] = product_facets(self.filtered_queryset)
+        
+        return response
 
 
+class ItemCodeSearchMixin:
+    """
+    Falls back to text search when a code-shaped search matches no item code.
+    
+    Views pass ``item_codes=self.item_code_search`` to the search helpers.
+    The code lookup runs with every other filter applied, and the text
+    search only runs when its first page comes back empty.
+    """
+    
+    item_code_search = True
+    
+    def paginate_queryset(self, queryset):
+        if not self.item_code_search or not is_item_code(self.request.query_params.get('search', '')):
+            return super().paginate_queryset(queryset)
+        
+        try:
+            page = super().paginate_queryset(queryset)
+        except NotFound:
+            # A page past the end; only fall back if no code matched at all
+            if queryset.exists():
+                raise
+            page = []
+        if page:
+            return page
+        
+        self.item_code_search = False
+        return super().paginate_queryset(self.filter_queryset(self.get_queryset()))
+
+
+class SearchResultCacheMixin:
+    """
+    Serves repeated searches from the in-process search result cache.
+    
+    Hits return the rendered JSON of an earlier response without touching
+    the database or the serializers. Only requests negotiated to the JSON
+    renderer use the cache; the browsable API and other formats render as
+    usual.
+    """
+    
+    def list(self, request, *args, **kwargs):
+        key = search_result_cache_key(request)
+        if key is None or not isinstance(request.accepted_renderer, JSONRenderer):
+            return self.list_uncached(request, *args, **kwargs)
+        
+        # The accepted media type carries options such as indent
+        key = (request.accepted_media_type, *key)
+        version, updated_at = get_catalog_version()
+        content = search_result_cache.get(version, key)
+        if content is None:
+            response = self.list_uncached(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            content = request.accepted_renderer.render(
+                response.data, request.accepted_media_type, self.get_renderer_context()
+            )
+            search_result_cache.set(version, key, content)
+        
+        return HttpResponse(content, content_type=request.accepted_renderer.media_type)
+    
+    def list_uncached(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+
+@method_decorator(catalog_conditional, name='dispatch')
 class CategoryListView(generics.ListAPIView):
     """List all active categories"""
     
@@ -23,17 +131,22 @@ class CategoryListView(generics.ListAPIView):
     ordering = ['name']
 
 
-class ProductListView(generics.ListAPIView):
+@method_decorator(catalog_conditional, name='dispatch')
+class ProductListView(SearchResultCacheMixin, ItemCodeSearchMixin, ProductFacetsMixin, generics.ListAPIView):
     """List products with search, filtering, and pagination"""
     
     serializer_class = ProductListSerializer
     permission_classes = [AllowAny]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    pagination_class = ProductListPagination
+    # Searching is handled in get_queryset via products.search
+    filter_backends = [DjangoFilterBackend, RelevanceOrderingFilter]
     filterset_fields = ['category', 'in_stock', 'brand', 'origin', 'is_active']
-    search_fields = ['name', 'description', 'item_code', 'brand']
     ordering_fields = ['name', 'item_code', 'created_at', 'stock_quantity']
     ordering = ['name']
     
+    def get_serializer_class(self):
+        return product_list_serializer_class()
+    
     def get_queryset(self):
         queryset = Product.objects.filter(is_active=True).select_related('category')
         
@@ -45,28 +158,8 @@ class ProductListView(generics.ListAPIView):
         origin = self.request.query_params.get('origin')
         
         if search:
-            # Enhanced search with multiple strategies
-            search_terms = search.strip().split()
-            search_filters = Q()
-            
-            for term in search_terms:
-                if term:  # Skip empty terms
-                    # Create a filter for each search term
-                    term_filter = (
-                        Q(name__icontains=term) |
-                        Q(description__icontains=term) |
-                        Q(item_code__icontains=term) |
-                        Q(brand__icontains=term) |
-                        Q(origin__icontains=term) |
-                        Q(category__name__icontains=term) |
-                        Q(category__description__icontains=term)
-                    )
-                    
-                    # Add to main search filter (AND logic between terms)
-                    search_filters &= term_filter
-            
-            # Apply the search filter
-            queryset = queryset.filter(search_filters)
+            # Full-text search, ranked by relevance
+            queryset = search_products(queryset, search, self.item_code_search)
         
         if category:
             queryset = queryset.filter(category_id=category)
@@ -86,6 +179,7 @@ class ProductListView(generics.ListAPIView):
         return queryset
 
 
+@method_decorator(catalog_conditional, name='dispatch')
 class ProductDetailView(generics.RetrieveAPIView):
     """Get detailed product information"""
     
@@ -95,48 +189,55 @@ class ProductDetailView(generics.RetrieveAPIView):
     lookup_field = 'pk'
 
 
-class ProductSearchView(generics.ListAPIView):
+@method_decorator(catalog_conditional, name='dispatch')
+class ProductSearchView(SearchResultCacheMixin, ItemCodeSearchMixin, ProductFacetsMixin, generics.ListAPIView):
     """Advanced product search with custom parameters"""
     
     serializer_class = ProductListSerializer
     permission_classes = [AllowAny]
     
+    def get_serializer_class(self):
+        return product_list_serializer_class()
+    
+    def get_search_params(self):
+        """Validate the search parameters once per request"""
+        if not hasattr(self, '_search_params'):
+            serializer = ProductSearchSerializer(data=self.request.query_params)
+            serializer.is_valid(raise_exception=True)
+            self._search_params = serializer.validated_data
+        return self._search_params
+    
+    def list_uncached(self, request, *args, **kwargs):
+        params = self.get_search_params()
+        
+        if params['mode'] == 'fuzzy' and is_postgresql(Product.objects.all()):
+            # The similarity threshold is transaction-local, so the page and
+            # count queries have to run inside the same transaction
+            threshold = params.get('threshold', settings.PRODUCT_FUZZY_SEARCH_THRESHOLD)
+            with transaction.atomic():
+                set_fuzzy_threshold(threshold)
+                return super().list_uncached(request, *args, **kwargs)
+        
+        return super().list_uncached(request, *args, **kwargs)
+    
     def get_queryset(self):
-        serializer = ProductSearchSerializer(data=self.request.query_params)
-        serializer.is_valid(raise_exception=True)
+        params = self.get_search_params()
         
         queryset = Product.objects.filter(is_active=True).select_related('category')
         
         # Apply search filters
-        search = serializer.validated_data.get('search', '')
-        category = serializer.validated_data.get('category')
-        in_stock = serializer.validated_data.get('in_stock')
-        brand = serializer.validated_data.get('brand')
-        origin = serializer.validated_data.get('origin')
+        search = params.get('search', '')
+        category = params.get('category')
+        in_stock = params.get('in_stock')
+        brand = params.get('brand')
+        origin = params.get('origin')
         
-        if search:
-            # Enhanced search with multiple strategies
-            search_terms = search.strip().split()
-            search_filters = Q()
-            
-            for term in search_terms:
-                if term:  # Skip empty terms
-                    # Create a filter for each search term
-                    term_filter = (
-                        Q(name__icontains=term) |
-                        Q(description__icontains=term) |
-                        Q(item_code__icontains=term) |
-                        Q(brand__icontains=term) |
-                        Q(origin__icontains=term) |
-                        Q(category__name__icontains=term) |
-                        Q(category__description__icontains=term)
-                    )
-                    
-                    # Add to main search filter (AND logic between terms)
-                    search_filters &= term_filter
-            
-            # Apply the search filter
-            queryset = queryset.filter(search_filters)
+        if search and params['mode'] == 'fuzzy':
+            # Trigram similarity on name and brand, ranked by similarity
+            queryset = fuzzy_search_products(queryset, search, self.item_code_search)
+        elif search:
+            # Full-text search, ranked by relevance
+            queryset = search_products(queryset, search, self.item_code_search)
         
         if category:
             queryset = queryset.filter(category_id=category)
@@ -150,54 +251,195 @@ class ProductSearchView(generics.ListAPIView):
         if origin:
             queryset = queryset.filter(origin__icontains=origin)
         
+        if search.strip():
+            # Keep the relevance/similarity ordering from the search
+            return queryset
+        
         return queryset.order_by('name')
 
 
+@catalog_conditional
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def product_stats_view(request):
     """Get product catalog statistics"""
     
-    total_products = Product.objects.filter(is_active=True).count()
-    total_categories = Category.objects.filter(is_active=True).count()
-    in_stock_products = Product.objects.filter(is_active=True, in_stock=True).count()
-    low_stock_products = Product.objects.filter(
-        is_active=True, 
-        stock_quantity__lte=10
-    ).count()
-    
-    # Category breakdown
-    category_stats = []
-    categories = Category.objects.filter(is_active=True)
-    for category in categories:
-        product_count = Product.objects.filter(
-            category=category, 
-            is_active=True
-        ).count()
-        if product_count > 0:
-            category_stats.append({
-                'category': category.name,
-                'product_count': product_count
-            })
+    # One grouped query on a miss, a single cache read otherwise
+    return Response(get_product_stats())
+
+
+@catalog_conditional
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def featured_products_view(request):
+    """Get featured products (recently added, in stock), optionally per category"""
+    
+    category = request.query_params.get('category')
+    # Category ids start at 1; '0' would otherwise read as no filter at all
+    if category and not (category.isascii() and category.isdigit() and int(category) > 0):
+        return Response(
+            {'error': 'Invalid category'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    # '007' and '7' share a cache entry
+    category = int(category) if category else None
     
+    # Rendered JSON is cached per catalog version, so repeat hits skip the
+    # product table, the serializers and the renderer
+    version, updated_at = get_catalog_version()
+    cache_key = featured_products_cache_key(version, category, request)
+    content = cache.get(cache_key)
+    
+    if content is None:
+        featured_products = Product.objects.filter(
+            is_active=True,
+            in_stock=True
+        ).select_related('category')
+        if category is not None:
+            featured_products = featured_products.filter(category_id=category)
+        featured_products = featured_products.order_by('-created_at')[:8]
+        
+        serializer_class = product_list_serializer_class()
+        serializer = serializer_class(featured_products, many=True, context={'request': request})
+        content = JSONRenderer().render(serializer.data)
+        cache.set(cache_key, content, FEATURED_PRODUCTS_CACHE_TIMEOUT)
+    
+    return HttpResponse(content, content_type='application/json')
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def product_suggest_view(request):
+    """Typeahead completions for product names, brands and item codes"""
+    
+    serializer = ProductSuggestSerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    
+    query = serializer.validated_data['q']
+    limit = serializer.validated_data['limit']
+    
+    # Served from the in-process prefix index, no database hit per keystroke
     return Response({
-        'total_products': total_products,
-        'total_categories': total_categories,
-        'in_stock_products': in_stock_products,
-        'low_stock_products': low_stock_products,
-        'category_breakdown': category_stats
+        'query': query,
+        'suggestions': get_suggest_index().lookup(query, limit)
     })
 
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def product_bulk_lookup_view(request):
+    """Look up many products by id and/or item_code in one request"""
+    
+    serializer = ProductBulkLookupSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Deduplicate while keeping the order the client asked for
+    ids = list(dict.fromkeys(serializer.validated_data.get('ids', [])))
+    item_codes = list(dict.fromkeys(
+        code.strip() for code in serializer.validated_data.get('item_codes', [])
+    ))
+    
+    products = Product.objects.filter(
+        Q(id__in=ids) | Q(item_code__in=item_codes),
+        is_active=True
+    ).select_related('category')
+    
+    by_id = {}
+    by_code = {}
+    for product in products:
+        by_id[product.id] = product
+        by_code[product.item_code] = product
+    
+    requested = {
+        'ids': [by_id.get(pk) for pk in ids],
+        'item_codes': [by_code.get(code) for code in item_codes],
+    }
+    
+    # Results follow the request body: each list in order, the lists in the
+    # order the client sent them. A product asked for twice appears once.
+    found = []
+    seen = set()
+    for key in [key for key in request.data if key in requested]:
+        for product in requested[key]:
+            if product is None or product.id in seen:
+                continue
+            seen.add(product.id)
+            found.append(product)
+    
+    serializer_class = product_list_serializer_class()
+    results = serializer_class(found, many=True, context={'request': request}).data
+    
+    return Response({
+        'results': results,
+        'missing': {
+            'ids': [pk for pk in ids if pk not in by_id],
+            'item_codes': [code for code in item_codes if code not in by_code],
+        }
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def search_cache_stats_view(request):
+    """Hit and miss counts of this process's search result cache"""
+    return Response(search_result_cache.stats())
+
+
+@api_view(['GET'])
+@permission_classes([IsStaffOrPartner])
+def product_export_view(request):
+    """Stream the full active catalog as NDJSON (default) or CSV"""
+    
+    export_type = request.query_params.get('type', 'ndjson')
+    if export_type == 'csv':
+        response = StreamingHttpResponse(stream_csv(), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="catalog.csv"'
+    elif export_type == 'ndjson':
+        response = StreamingHttpResponse(stream_ndjson(), content_type='application/x-ndjson')
+    else:
+        return Response(
+            {'error': 'Invalid export type, use ndjson or csv'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    # Lets sync jobs skip the next export if the catalog has not changed
+    version, updated_at = get_catalog_version()
+    response['X-Catalog-Version'] = str(version)
+    return response
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
-def featured_products_view(request):
-    """Get featured products (recently added, in stock)"""
+def product_changes_view(request):
+    """
+    Products and categories changed since the ``since`` cursor.
+    
+    ``since`` is the ``next`` value of the previous response, a catalog
+    version or an ISO 8601 timestamp; URL-encode a ``+`` offset as ``%2B`` or
+    use ``Z``.
+    """
     
-    featured_products = Product.objects.filter(
-        is_active=True,
-        in_stock=True
-    ).order_by('-created_at')[:8]
+    limit = request.query_params.get('limit', str(CHANGES_DEFAULT_LIMIT))
+    if not limit.isdigit() or int(limit) < 1:
+        return Response({'error': 'Invalid limit'}, status=status.HTTP_400_BAD_REQUEST)
+    limit = min(int(limit), CHANGES_MAX_LIMIT)
     
-    serializer = ProductListSerializer(featured_products, many=True)
-    return Response(serializer.data)
+    try:
+        position = decode_cursor(request.query_params.get('since', ''))
+    except InvalidCursor as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    changes = get_changes(position, limit)
+    serializer_class = product_list_serializer_class()
+    context = {'request': request}
+    version, updated_at = get_catalog_version()
+    
+    return Response({
+        'products': serializer_class(changes['products'], many=True, context=context).data,
+        'categories': CategorySerializer(changes['categories'], many=True).data,
+        'deleted': changes['deleted'],
+        'next': changes['next'],
+        'has_more': changes['has_more'],
+        'version': version,
+    })